@@ -1,3 +1,111 @@
+from uuid import uuid4
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.utils.functional import cached_property
+
+from .models import Booking, Listing, Payment, PriceRule, Review
+from .outbox import enqueue
+from .tasks import reverify_payment
+
+# Below this many rows an exact COUNT(*) is cheap enough
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+def estimated_row_count(model):
+    """
+    Return the database's row estimate for a model's table, or None if the
+    backend does not keep one.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        elif connection.vendor == "mysql":
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the table's row estimate instead of COUNT(*) for unfiltered
+    changelists of large tables. Filtered changelists are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, "query", None)
+        if query is not None and not query.where:
+            estimate = estimated_row_count(self.object_list.model)
+            if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) behind "N total"
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class PriceRuleInline(admin.TabularInline):
+    model = PriceRule
+    extra = 0
+
+
+@admin.register(Listing)
+class ListingAdmin(LargeTableAdmin):
+    list_display = ("id", "title", "price", "owner")
+    list_select_related = ("owner",)
+    search_fields = ("title",)
+    raw_id_fields = ("owner",)
+    inlines = [PriceRuleInline]
+
+
+@admin.register(Booking)
+class BookingAdmin(LargeTableAdmin):
+    list_display = ("id", "listing", "guest", "check_in_date", "check_out_date", "status", "hold_expires_at")
+    list_select_related = ("listing", "guest")
+    list_filter = ("status", "check_in_date")
+    autocomplete_fields = ("listing",)
+    raw_id_fields = ("guest",)
+    ordering = ("-id",)
+
+
+@admin.register(Review)
+class ReviewAdmin(LargeTableAdmin):
+    list_display = ("id", "listing", "guest", "rating")
+    list_select_related = ("listing", "guest")
+    autocomplete_fields = ("listing",)
+    raw_id_fields = ("guest",)
+    ordering = ("-id",)
+
+
+@admin.register(Payment)
+class PaymentAdmin(LargeTableAdmin):
+    list_display = ("id", "booking", "amount", "status", "transaction_id", "created_at")
+    # Booking.__str__ uses the listing title and guest username
+    list_select_related = ("booking__listing", "booking__guest")
+    list_filter = ("status", "created_at")
+    # Exact match so the search uses the transaction_id index
+    search_fields = ("=transaction_id",)
+    raw_id_fields = ("booking",)
+    ordering = ("-id",)
+    actions = ["reverify_payments"]
 
-# Register your models here.
+    @admin.action(description="Re-verify selected payments with Chapa")
+    def reverify_payments(self, request, queryset):
+        payment_ids = list(queryset.values_list("id", flat=True))
+        with transaction.atomic():
+            for payment_id in payment_ids:
+                enqueue(reverify_payment, f"payment-reverify:{payment_id}:{uuid4().hex}", payment_id=payment_id)
+        self.message_user(request, f"Queued re-verification of {len(payment_ids)} payments.")
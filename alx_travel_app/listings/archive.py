@@ -0,0 +1,149 @@
+"""
+Archival of historical bookings and payments.
+
+Bookings whose stay ended before a cutoff, and whose payment (if any) is no
+longer pending or awaiting a refund, are copied into ArchivedBooking/ArchivedPayment and removed
+from the hot tables in batches, one transaction per batch. Archived rows keep
+their original primary key, which doubles as the lookup index by id.
+"""
+import statistics
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ArchivedBooking, ArchivedPayment, Booking, Listing, Payment
+
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 1000
+
+BOOKING_FIELDS = ("id", "listing_id", "guest_id", "check_in_date", "check_out_date", "status")
+PAYMENT_FIELDS = ("id", "amount", "status", "transaction_id", "created_at", "updated_at")
+
+
+def archivable_bookings(cutoff):
+    """
+    Bookings checked out before ``cutoff`` without a pending or unrefunded payment.
+    """
+    return Booking.objects.filter(check_out_date__lt=cutoff).exclude(
+        payment__status__in=["pending", "refund_required"]
+    )
+
+
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move one batch of archivable bookings and their payments to the archive.
+
+    Returns the number of bookings archived.
+    """
+    with transaction.atomic():
+        rows = list(
+            archivable_bookings(cutoff)
+            .order_by("id")
+            .values(*BOOKING_FIELDS, *(f"payment__{field}" for field in PAYMENT_FIELDS))[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        bookings = [ArchivedBooking(**{field: row[field] for field in BOOKING_FIELDS}) for row in rows]
+        payments = [
+            ArchivedPayment(booking_id=row["id"], **{field: row[f"payment__{field}"] for field in PAYMENT_FIELDS})
+            for row in rows
+            if row["payment__id"] is not None
+        ]
+        # ignore_conflicts keeps a re-run after a partial failure idempotent
+        ArchivedBooking.objects.bulk_create(bookings, ignore_conflicts=True)
+        ArchivedPayment.objects.bulk_create(payments, ignore_conflicts=True)
+
+        Payment.objects.filter(pk__in=[payment.id for payment in payments]).delete()
+        Booking.objects.filter(pk__in=[booking.id for booking in bookings]).delete()
+    return len(rows)
+
+
+def archive(days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Archive every booking that checked out more than ``days`` days ago.
+
+    Returns the number of bookings archived.
+    """
+    cutoff = timezone.localdate() - timedelta(days=days)
+    total = 0
+    while True:
+        archived = archive_batch(cutoff, batch_size)
+        total += archived
+        if archived < batch_size:
+            return total
+
+
+def get_archived_booking(booking_id):
+    """
+    Return the ArchivedBooking with this id, or None.
+    """
+    return ArchivedBooking.objects.filter(pk=booking_id).first()
+
+
+def archived_trips(guest_id, cursor=None, limit=20):
+    """
+    Return up to ``limit`` of a guest's archived bookings, most recent
+    check-in first and after ``cursor`` (a ``(check_in_date, id)`` position).
+
+    Each booking gets ``listing`` (None if deleted since) and ``payment``
+    (an ArchivedPayment or None) attributes, fetched in one query each.
+    """
+    trips = ArchivedBooking.objects.filter(guest_id=guest_id).order_by("-check_in_date", "-id")
+    if cursor:
+        trips = trips.filter(Q(check_in_date__lt=cursor[0]) | Q(check_in_date=cursor[0], id__lt=cursor[1]))
+    trips = list(trips[:limit])
+    if trips:
+        listings = Listing.objects.in_bulk({trip.listing_id for trip in trips})
+        payments = {
+            payment.booking_id: payment
+            for payment in ArchivedPayment.objects.filter(booking_id__in=[trip.id for trip in trips])
+        }
+        for trip in trips:
+            trip.listing = listings.get(trip.listing_id)
+            trip.payment = payments.get(trip.id)
+    return trips
+
+
+def table_size(model):
+    """
+    Return the on-disk size in bytes of a model's table and indexes, or None
+    if the database backend does not expose it.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+        elif connection.vendor == "mysql":
+            cursor.execute(
+                "SELECT data_length + index_length FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def query_latency(runs=5):
+    """
+    Median seconds taken by representative hot-table queries: a full count
+    of bookings and payments, and the upcoming stays scan.
+    """
+    today = timezone.localdate()
+    queries = [
+        lambda: Booking.objects.count(),
+        lambda: Payment.objects.filter(status="completed").count(),
+        lambda: list(Booking.objects.filter(check_out_date__gte=today).values_list("id", flat=True)),
+    ]
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        for query in queries:
+            query()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
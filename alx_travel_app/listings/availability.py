@@ -0,0 +1,109 @@
+"""
+Listing availability calendars.
+
+A calendar covers the nights in ``[start_date, end_date)`` and is returned
+both as a per-night bitmap string ("1" = booked) and as a run-length
+encoding of ``[booked, nights]`` pairs. Calendars for any number of listings
+are built from a single query over the ``(listing, check_in_date,
+check_out_date)`` index and cached per listing until one of its bookings is
+written (see signals.py), or until the earliest hold it includes expires.
+"""
+import math
+
+from django.core.cache import cache
+from django.db.models import FilteredRelation, Q
+from django.utils import timezone
+
+from .caching import get_versions
+from .models import Listing
+
+AVAILABILITY_NAMESPACE = "availability"
+CALENDAR_CACHE_TIMEOUT = 60 * 60
+MAX_CALENDAR_NIGHTS = 366
+MAX_CALENDAR_LISTINGS = 100
+
+
+def encode_runs(bitmap):
+    """
+    Return the run-length encoding of a bitmap string as ``[booked, nights]`` pairs.
+    """
+    runs = []
+    for night in bitmap:
+        booked = int(night)
+        if runs and runs[-1][0] == booked:
+            runs[-1][1] += 1
+        else:
+            runs.append([booked, 1])
+    return runs
+
+
+def _build_calendars(listing_ids, start_date, end_date):
+    """
+    Return ``({listing_id: calendar}, {listing_id: cache timeout})``.
+    """
+    nights = (end_date - start_date).days
+    now = timezone.now()
+    # LEFT JOIN so listings without bookings in the window still come back.
+    # Expired holds are left out even if the sweeper has not run yet.
+    rows = (
+        Listing.objects.filter(pk__in=listing_ids)
+        .annotate(stays=FilteredRelation(
+            "booking",
+            condition=Q(booking__check_in_date__lt=end_date, booking__check_out_date__gt=start_date)
+            & (Q(booking__status="confirmed") | Q(booking__status="held", booking__hold_expires_at__gt=now)),
+        ))
+        .values_list("id", "stays__check_in_date", "stays__check_out_date", "stays__hold_expires_at")
+    )
+    bitmaps = {}
+    timeouts = {}
+    for listing_id, check_in_date, check_out_date, hold_expires_at in rows:
+        bitmap = bitmaps.setdefault(listing_id, bytearray(b"0" * nights))
+        timeouts.setdefault(listing_id, CALENDAR_CACHE_TIMEOUT)
+        if check_in_date is None:
+            continue
+        if hold_expires_at is not None:
+            # The nights free up when the hold expires, without any write
+            seconds = math.ceil((hold_expires_at - now).total_seconds())
+            timeouts[listing_id] = max(1, min(timeouts[listing_id], seconds))
+        first = max((check_in_date - start_date).days, 0)
+        stop = min((check_out_date - start_date).days, nights)
+        bitmap[first:stop] = b"1" * (stop - first)
+
+    calendars = {}
+    for listing_id, bitmap in bitmaps.items():
+        bitmap = bitmap.decode()
+        calendars[listing_id] = {
+            "listing": listing_id,
+            "start_date": start_date,
+            "end_date": end_date,
+            "bitmap": bitmap,
+            "runs": encode_runs(bitmap),
+        }
+    return calendars, timeouts
+
+
+def get_calendars(listing_ids, start_date, end_date):
+    """
+    Return ``{listing_id: calendar}`` for the given listings.
+
+    Unknown listing ids are left out of the result.
+    """
+    versions = get_versions(AVAILABILITY_NAMESPACE, listing_ids)
+    keys = {
+        f"calendar:{listing_id}:{version}:{start_date.isoformat()}:{end_date.isoformat()}": listing_id
+        for listing_id, version in versions.items()
+    }
+    cached = cache.get_many(list(keys))
+    calendars = {keys[key]: calendar for key, calendar in cached.items()}
+
+    missing = [listing_id for key, listing_id in keys.items() if key not in cached]
+    if missing:
+        built, timeouts = _build_calendars(missing, start_date, end_date)
+        by_timeout = {}
+        for key, listing_id in keys.items():
+            if listing_id in built:
+                by_timeout.setdefault(timeouts[listing_id], {})[key] = built[listing_id]
+        for timeout, entries in by_timeout.items():
+            cache.set_many(entries, timeout)
+        calendars.update(built)
+    return calendars
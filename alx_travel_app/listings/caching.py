@@ -0,0 +1,57 @@
+"""
+Per-listing cache versions.
+
+Cached values embed the listing's current version in their key, so bumping
+the version invalidates every entry for that listing without having to
+enumerate or delete keys.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(namespace, listing_id):
+    return f"version:{namespace}:{listing_id}"
+
+
+def _fresh_version():
+    # Time-based so a version key evicted from the cache never restarts at a
+    # number whose entries might still be cached.
+    return int(time.time() * 1000)
+
+
+def get_version(namespace, listing_id):
+    """
+    Return the current cache version for a listing within a namespace.
+    """
+    key = _version_key(namespace, listing_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace, listing_id):
+    """
+    Invalidate every cached value for a listing within a namespace.
+    """
+    key = _version_key(namespace, listing_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), None)
+
+
+def get_versions(namespace, listing_ids):
+    """
+    Return ``{listing_id: version}`` for several listings in one cache round-trip.
+    """
+    keys = {_version_key(namespace, listing_id): listing_id for listing_id in listing_ids}
+    found = cache.get_many(list(keys))
+    missing = {key: _fresh_version() for key in keys if key not in found}
+    for key, version in missing.items():
+        if not cache.add(key, version, None):
+            version = cache.get(key)
+        found[key] = version
+    return {listing_id: found[key] for key, listing_id in keys.items()}
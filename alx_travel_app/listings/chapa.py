@@ -0,0 +1,138 @@
+"""
+Chapa payment verification shared by the verify endpoint and the admin's
+bulk re-verification task.
+"""
+import time
+
+import requests
+from django.conf import settings
+from django.db import transaction
+
+from .models import Booking, Listing, Payment
+from .outbox import enqueue
+from .payment_events import record_transition
+from .tasks import send_payment_confirmation_email
+
+# Payments Chapa has already settled; errors while re-verifying them are only logged
+SETTLED_STATUSES = ("completed", "refund_required")
+
+
+def verify_with_chapa(payment, source="verify"):
+    """
+    Verify a payment with Chapa, update its status (confirming the booking
+    on success) and log the transition.
+
+    A successful payment only confirms its booking if the booking's nights
+    are still free; a payment that arrives after its hold lapsed and the
+    nights were taken is marked ``refund_required`` instead.
+
+    A transport or HTTP error marks a pending payment as failed, but never
+    downgrades a settled (``completed`` or ``refund_required``) one, so a
+    brief Chapa outage cannot leave a confirmed booking with a failed
+    payment. Admin re-verification (``source="admin"``) never changes a
+    status on such errors. In both cases the error is logged.
+
+    Returns ``(body, status_code)`` for the verify endpoint's response.
+    """
+    transaction_id = payment.transaction_id
+    CHAPA_SECRET = getattr(settings, "CHAPA_SECRET", None)
+    if not CHAPA_SECRET:
+        return {"detail": "Chapa secret key not configured."}, 500
+
+    chapa_url = f"https://api.chapa.co/v1/transaction/verify/{transaction_id}"
+    headers = {
+        "Authorization": f"Bearer {CHAPA_SECRET}",
+        "Content-Type": "application/json",
+    }
+    previous_status = payment.status
+    chapa_resp = None
+    started = time.perf_counter()
+    try:
+        chapa_resp = requests.get(chapa_url, headers=headers, timeout=10)
+        latency_ms = (time.perf_counter() - started) * 1000
+        chapa_data = chapa_resp.json()
+        if chapa_resp.status_code != 200 or chapa_data.get("status") != "success":
+            _fail_on_error(payment, previous_status, source)
+            record_transition(payment, previous_status, source, chapa_data, chapa_resp.status_code, latency_ms)
+            return {
+                "transaction_id": transaction_id,
+                "status": payment.status,
+                "detail": "Payment verification failed.",
+                "chapa_response": chapa_data
+            }, 502
+        # Chapa returns payment status in chapa_data["data"]["status"]
+        chapa_status = chapa_data["data"].get("status", "")
+        with transaction.atomic():
+            # Lock the booking and payment so the hold sweeper cannot expire
+            # or cancel them between the checks below and the update, and the
+            # listing so no new booking can take the nights meanwhile
+            booking = Booking.objects.select_for_update().get(pk=payment.booking_id)
+            Listing.objects.select_for_update().get(pk=booking.listing_id)
+            previous_status = Payment.objects.select_for_update().values_list("status", flat=True).get(pk=payment.pk)
+            if chapa_status != "success":
+                payment.status = "failed"
+            elif booking.status == "confirmed" or _nights_available(booking):
+                payment.status = "completed"
+            else:
+                payment.status = "refund_required"
+            payment.save()
+            if payment.status == "completed" and booking.status != "confirmed":
+                booking.status = "confirmed"
+                booking.hold_expires_at = None
+                booking.save(update_fields=["status", "hold_expires_at"])
+            payment.booking = booking
+            guest = booking.guest
+            # Only on the transition, so re-verifying never emails twice
+            if payment.status == "completed" and previous_status != "completed" and guest.email:
+                enqueue(
+                    send_payment_confirmation_email,
+                    f"payment-confirmation:{payment.id}",
+                    user_email=guest.email,
+                    booking_id=payment.booking_id,
+                )
+        record_transition(payment, previous_status, source, chapa_data, chapa_resp.status_code, latency_ms)
+        if payment.status == "refund_required":
+            return {
+                "transaction_id": transaction_id,
+                "status": payment.status,
+                "detail": "The booking's dates are no longer available; the payment will be refunded.",
+            }, 409
+    except Exception as e:
+        _fail_on_error(payment, previous_status, source)
+        record_transition(
+            payment, previous_status, source, {"error": str(e)},
+            chapa_resp.status_code if chapa_resp is not None else None,
+            (time.perf_counter() - started) * 1000,
+        )
+        return {
+            "transaction_id": transaction_id,
+            "status": payment.status,
+            "detail": f"Error contacting Chapa: {str(e)}"
+        }, 502
+
+    return {
+        "transaction_id": transaction_id,
+        "status": payment.status,
+        "detail": "Payment verification complete."
+    }, 200
+
+
+def _fail_on_error(payment, previous_status, source):
+    if source != "admin" and previous_status not in SETTLED_STATUSES:
+        payment.status = "failed"
+        payment.save()
+    else:
+        # Also undoes a status set in memory by a rolled back update
+        payment.status = previous_status
+
+
+def _nights_available(booking):
+    """
+    Return whether no other active booking overlaps ``booking``'s nights.
+    Callers hold a lock on the listing.
+    """
+    return not (
+        Booking.objects.overlapping(booking.listing_id, booking.check_in_date, booking.check_out_date)
+        .exclude(pk=booking.pk)
+        .exists()
+    )
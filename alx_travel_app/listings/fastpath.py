@@ -0,0 +1,129 @@
+"""
+Fast read-only path for high-volume ``list`` actions.
+
+Instead of instantiating model objects and running every DRF field per row,
+a FastListPlan is derived once from a serializer class: the columns to fetch
+with ``.values_list()``, and only the per-field conversions whose output
+differs from the raw database value. Rows are mapped straight to dicts and
+rendered with OrjsonRenderer; the result is byte-for-byte what the
+serializer and JSONRenderer produce. Serializers with fields the plan does
+not know how to reproduce keep using the regular path.
+"""
+import decimal
+import logging
+from functools import lru_cache
+
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+from .renderers import OrjsonRenderer
+
+logger = logging.getLogger(__name__)
+
+# Fields whose representation of a database value is the value itself
+PASSTHROUGH_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.BooleanField)
+
+
+def _decimal_converter(field):
+    # DecimalField.to_representation with the quantize context built once
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def to_representation(value):
+        if not isinstance(value, decimal.Decimal):
+            return field.to_representation(value)
+        return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+    return to_representation
+
+
+class FastListPlan:
+    def __init__(self, names, columns, converters):
+        self.names = names
+        self.columns = columns
+        # (position, to_representation) for values that need converting
+        self.converters = converters
+
+    @classmethod
+    def from_serializer(cls, serializer_class):
+        """
+        Return a plan reproducing ``serializer_class``, or None if one of its
+        fields cannot be reproduced from ``.values_list()`` rows.
+        """
+        names, columns, converters = [], [], []
+        for position, field in enumerate(serializer_class().fields.values()):
+            if field.write_only or '.' in field.source or field.source == '*':
+                return None
+            if type(field) in PASSTHROUGH_FIELDS:
+                converter = None
+            elif type(field) is serializers.PrimaryKeyRelatedField and field.pk_field is None:
+                converter = None
+            elif type(field) is serializers.ChoiceField and all(isinstance(key, str) for key in field.choices):
+                # A stored string choice is represented as itself
+                converter = None
+            elif type(field) is serializers.DateField and getattr(field, 'format', api_settings.DATE_FORMAT) in (None, ISO_8601):
+                # Dates are rendered as ISO 8601 by the encoder already
+                converter = None
+            elif type(field) is serializers.DecimalField:
+                converter = _decimal_converter(field)
+            elif type(field) is serializers.DateTimeField:
+                converter = field.to_representation
+            else:
+                return None
+            names.append(field.field_name)
+            columns.append(field.source)
+            if converter is not None:
+                converters.append((position, converter))
+        return cls(tuple(names), tuple(columns), tuple(converters))
+
+    def rows(self, queryset):
+        """
+        Return the serialized rows of ``queryset`` as a list of dicts.
+        """
+        names, converters = self.names, self.converters
+        rows = queryset.values_list(*self.columns)
+        if not converters:
+            return [dict(zip(names, row)) for row in rows]
+        data = []
+        for row in rows:
+            row = list(row)
+            for position, converter in converters:
+                if row[position] is not None:
+                    row[position] = converter(row[position])
+            data.append(dict(zip(names, row)))
+        return data
+
+
+@lru_cache(maxsize=None)
+def get_fast_list_plan(serializer_class):
+    plan = FastListPlan.from_serializer(serializer_class)
+    if plan is None:
+        logger.warning("%s has no fast list plan; its list action uses the regular serializer", serializer_class.__name__)
+    return plan
+
+
+class FastListMixin:
+    """
+    Serves unpaginated ``list`` actions through a FastListPlan of the
+    viewset's serializer class and OrjsonRenderer.
+    """
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action == 'list':
+            renderers = [OrjsonRenderer() if type(renderer) is JSONRenderer else renderer for renderer in renderers]
+        return renderers
+
+    def list(self, request, *args, **kwargs):
+        plan = get_fast_list_plan(self.get_serializer_class())
+        if plan is None or self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(plan.rows(queryset))
@@ -0,0 +1,64 @@
+"""
+Temporary holds on unpaid bookings.
+
+Bookings created through the API start as ``held`` until
+``hold_expires_at`` and become ``confirmed`` once their payment completes.
+Availability queries treat holds past their expiry as free straight away
+(``Booking.objects.active()``); the sweeper only tidies up afterwards by
+marking them ``expired`` and cancelling their pending payments. Each
+cancellation is written to the payment event log in the same transaction,
+not through the buffered writer, so the log can never miss one.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Booking, Payment, PaymentEvent
+
+HOLD_SWEEP_BATCH_SIZE = 5000
+
+
+def hold_expiry(now=None):
+    """
+    Return when a hold placed now expires.
+    """
+    now = now or timezone.now()
+    return now + timedelta(minutes=getattr(settings, "BOOKING_HOLD_MINUTES", 15))
+
+
+def expire_holds(batch_size=HOLD_SWEEP_BATCH_SIZE, now=None):
+    """
+    Mark expired holds as ``expired`` in batches, cancelling their pending
+    payments. Returns the number of bookings expired.
+    """
+    now = now or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            # Walks the (status, hold_expires_at) index
+            ids = list(
+                Booking.objects.expired_holds(now)
+                .order_by("hold_expires_at")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                return total
+            Booking.objects.filter(pk__in=ids, status="held").update(status="expired")
+            payments = Payment.objects.filter(booking_id__in=ids, status="pending")
+            cancelled = list(payments.values_list("id", "transaction_id"))
+            payments.update(status="cancelled")
+            PaymentEvent.objects.bulk_create([
+                PaymentEvent(
+                    payment_id=payment_id,
+                    transaction_id=transaction_id,
+                    source="hold_expiry",
+                    from_status="pending",
+                    to_status="cancelled",
+                )
+                for payment_id, transaction_id in cancelled
+            ])
+        total += len(ids)
+        if len(ids) < batch_size:
+            return total
@@ -0,0 +1,86 @@
+"""
+Per-request batch loaders for the GraphQL API.
+
+Resolvers ask a loader for one key at a time, but the first miss fetches
+every key primed so far in a single query. Whenever a list of objects is
+resolved, their keys are primed on the loaders their fields will use, so
+each nesting level of a query costs one query per relation instead of one
+per object.
+"""
+from collections import defaultdict
+
+from .models import Booking, Listing, Payment, Review
+
+
+class BatchLoader:
+    def __init__(self, batch_fn, many=False, on_load=None):
+        # batch_fn(keys) returns {key: value}; many loaders map keys to lists
+        self.batch_fn = batch_fn
+        self.many = many
+        self.on_load = on_load
+        self.pending = set()
+        self.cache = {}
+
+    def prime(self, keys):
+        self.pending.update(key for key in keys if key not in self.cache)
+
+    def add(self, values):
+        # Cache {key: value} fetched elsewhere so loading them costs no query
+        for key, value in values.items():
+            self.cache.setdefault(key, value)
+            self.pending.discard(key)
+
+    def load(self, key):
+        if key not in self.cache:
+            keys = self.pending | {key}
+            self.pending = set()
+            results = self.batch_fn(list(keys))
+            for batch_key in keys:
+                self.cache[batch_key] = results.get(batch_key, [] if self.many else None)
+            if self.on_load:
+                loaded = [obj for value in results.values() for obj in (value if self.many else [value])]
+                self.on_load(loaded)
+        return self.cache[key]
+
+
+def _group_by(model, field):
+    def batch_fn(keys):
+        grouped = defaultdict(list)
+        for obj in model.objects.filter(**{f"{field}__in": keys}).order_by("id"):
+            grouped[getattr(obj, field)].append(obj)
+        return grouped
+    return batch_fn
+
+
+class Loaders:
+    def __init__(self):
+        self.listing = BatchLoader(Listing.objects.in_bulk, on_load=self.prime_listings)
+        self.reviews_by_listing = BatchLoader(_group_by(Review, "listing_id"), many=True, on_load=self.prime_reviews)
+        self.bookings_by_listing = BatchLoader(_group_by(Booking, "listing_id"), many=True, on_load=self.prime_bookings)
+        self.payment_by_booking = BatchLoader(
+            lambda keys: {payment.booking_id: payment for payment in Payment.objects.filter(booking_id__in=keys)}
+        )
+
+    def prime_listings(self, listings):
+        self.listing.add({listing.id: listing for listing in listings})
+        ids = [listing.id for listing in listings]
+        self.reviews_by_listing.prime(ids)
+        self.bookings_by_listing.prime(ids)
+
+    def prime_bookings(self, bookings):
+        self.payment_by_booking.prime(booking.id for booking in bookings)
+        self.listing.prime(booking.listing_id for booking in bookings)
+
+    def prime_reviews(self, reviews):
+        self.listing.prime(review.listing_id for review in reviews)
+
+
+def get_loaders(info):
+    """
+    Return the loaders of the current request, creating them on first use.
+    """
+    context = info.context
+    loaders = getattr(context, "_graphql_loaders", None)
+    if loaders is None:
+        loaders = context._graphql_loaders = Loaders()
+    return loaders
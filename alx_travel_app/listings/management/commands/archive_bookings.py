@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from listings.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, archivable_bookings, archive, query_latency, table_size
+from listings.models import Booking, Payment
+
+class Command(BaseCommand):
+    help = 'Moves completed stays and settled payments older than a cutoff into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help='Archive stays that checked out more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='Bookings moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many bookings would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.localdate() - timedelta(days=options['days'])
+        if options['dry_run']:
+            count = archivable_bookings(cutoff).count()
+            self.stdout.write(f'{count} bookings checked out before {cutoff} would be archived.')
+            return
+
+        before = self._measure()
+        archived = archive(days=options['days'], batch_size=options['batch_size'])
+        after = self._measure()
+
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} bookings checked out before {cutoff}.'))
+        for model in (Booking, Payment):
+            name = model.__name__
+            self.stdout.write(
+                f"{name}: {before[name]['rows']} -> {after[name]['rows']} rows, "
+                f"{self._size(before[name]['size'])} -> {self._size(after[name]['size'])}"
+            )
+        self.stdout.write(f"Hot-table query latency: {before['latency'] * 1000:.1f}ms -> {after['latency'] * 1000:.1f}ms")
+
+    def _measure(self):
+        measurements = {
+            model.__name__: {'rows': model.objects.count(), 'size': table_size(model)}
+            for model in (Booking, Payment)
+        }
+        measurements['latency'] = query_latency()
+        return measurements
+
+    def _size(self, size):
+        return 'size n/a' if size is None else f'{size / 1024 / 1024:.1f}MB'
@@ -0,0 +1,83 @@
+from datetime import date, timedelta
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from listings.models import Booking, Listing, Payment, Review
+
+ADMIN_PAGES = [
+    '/admin/listings/booking/',
+    '/admin/listings/booking/?status__exact=confirmed',
+    '/admin/listings/payment/',
+    '/admin/listings/payment/?status__exact=pending',
+    '/admin/listings/review/',
+]
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = 'Benchmarks admin changelist pages on large tables (test rows are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Number of bookings (with payments and reviews) to create')
+        parser.add_argument('--listings', type=int, default=1000, help='Number of listings the bookings are spread over')
+        parser.add_argument('--runs', type=int, default=5, help='Requests per page')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                admin_user = self._seed(options['rows'], options['listings'])
+                client = Client(SERVER_NAME='localhost')
+                client.force_login(admin_user)
+
+                for path in ADMIN_PAGES:
+                    timings = []
+                    for _ in range(options['runs']):
+                        with CaptureQueriesContext(connection) as queries:
+                            started = time.perf_counter()
+                            response = client.get(path)
+                            timings.append(time.perf_counter() - started)
+                        if response.status_code != 200:
+                            self.stderr.write(f'{path} returned {response.status_code}')
+                            break
+                    timings.sort()
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{path}: median {timings[len(timings) // 2] * 1000:.1f}ms, {len(queries)} queries'
+                    ))
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _seed(self, rows, listing_count):
+        started = time.perf_counter()
+        admin_user = User.objects.create_superuser(username='benchmark-admin', password=None)
+        guest, _ = User.objects.get_or_create(username='benchmark-guest')
+        listings = Listing.objects.bulk_create([
+            Listing(title=f'Benchmark listing {i}', description='', price=100, owner=guest)
+            for i in range(listing_count)
+        ])
+        check_in_date = date(2030, 1, 1)
+        for offset in range(0, rows, 10000):
+            bookings = Booking.objects.bulk_create([
+                Booking(
+                    listing=listings[i % listing_count],
+                    guest=guest,
+                    check_in_date=check_in_date + timedelta(days=i % 365),
+                    check_out_date=check_in_date + timedelta(days=i % 365 + 2),
+                )
+                for i in range(offset, min(offset + 10000, rows))
+            ])
+            Payment.objects.bulk_create([
+                Payment(booking=booking, amount=200, status='completed' if i % 4 else 'pending', transaction_id=f'benchmark-{booking.id}')
+                for i, booking in enumerate(bookings)
+            ])
+            Review.objects.bulk_create([
+                Review(listing=booking.listing, guest=guest, rating=i % 5 + 1, comment='')
+                for i, booking in enumerate(bookings)
+            ])
+        self.stdout.write(f'Created {rows} bookings, payments and reviews in {time.perf_counter() - started:.2f}s')
+        return admin_user
@@ -0,0 +1,61 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from listings.models import Listing
+
+LISTING_FIELDS = """
+    id title description price ownerId
+    reviews { id rating comment guestId }
+    bookings { id checkInDate checkOutDate guestId payment { status amount transactionId } }
+"""
+LISTING_QUERY = "query ($id: ID!) { listing(id: $id) { %s } }" % LISTING_FIELDS
+# Page size is inlined so the query cost limit can use it
+LISTINGS_QUERY = "query { listings(first: %%d) { %s } }" % LISTING_FIELDS
+
+class Command(BaseCommand):
+    help = 'Compares round-trips and SQL queries of the GraphQL API against the REST equivalent'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listing', type=int, help='Listing id for the listing page (defaults to the first listing)')
+        parser.add_argument('--page-size', type=int, default=20, help='Listings fetched for the search page')
+
+    def handle(self, *args, **options):
+        listing_id = options['listing'] or Listing.objects.values_list('id', flat=True).order_by('id').first()
+        if listing_id is None:
+            raise CommandError('No listings found; run "python manage.py seed" first.')
+
+        client = Client(SERVER_NAME='localhost')
+        user = User.objects.order_by('id').first()
+        if user:
+            client.force_login(user)
+
+        self._report('REST listing page', client, [
+            ('get', f'/api/listings/{listing_id}/', None),
+            # No per-listing filter: the client fetches every booking and filters locally
+            ('get', '/api/bookings/', None),
+        ])
+        self._report('GraphQL listing page', client, [
+            ('post', '/graphql/', {'query': LISTING_QUERY, 'variables': {'id': listing_id}}),
+        ])
+        self._report(f'GraphQL {options["page_size"]} listings', client, [
+            ('post', '/graphql/', {'query': LISTINGS_QUERY % options['page_size']}),
+        ])
+        self.stdout.write('REST has no endpoints for reviews or payment status of a listing page.')
+
+    def _report(self, label, client, requests):
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            for method, path, body in requests:
+                if method == 'post':
+                    response = client.post(path, json.dumps(body), content_type='application/json')
+                else:
+                    response = client.get(path)
+                if response.status_code != 200:
+                    raise CommandError(f'{path} returned {response.status_code}: {response.content[:200]!r}')
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(f'{label}: {len(requests)} round-trips, {len(queries)} SQL queries, {elapsed:.1f}ms')
@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from listings.holds import HOLD_SWEEP_BATCH_SIZE, expire_holds
+from listings.models import Booking, Listing
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = 'Benchmarks the expired hold sweeper (test rows are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--holds', type=int, default=1000000, help='Number of held bookings to create')
+        parser.add_argument('--expired-ratio', type=float, default=0.5, help='Fraction of holds that have expired')
+        parser.add_argument('--batch-size', type=int, default=HOLD_SWEEP_BATCH_SIZE, help='Holds expired per transaction')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._seed(options['holds'], options['expired_ratio'])
+
+                started = time.perf_counter()
+                active = Booking.objects.active().count()
+                self.stdout.write(f'Active bookings before sweeping: {active} ({time.perf_counter() - started:.2f}s to count)')
+
+                started = time.perf_counter()
+                expired = expire_holds(batch_size=options['batch_size'])
+                elapsed = time.perf_counter() - started
+                rate = expired / elapsed if elapsed else float('inf')
+                self.stdout.write(self.style.SUCCESS(
+                    f'Expired {expired} of {options["holds"]} holds in {elapsed:.2f}s ({rate:,.0f} holds/sec)'
+                ))
+
+                started = time.perf_counter()
+                expire_holds(batch_size=options['batch_size'])
+                self.stdout.write(f'Sweep with nothing to expire: {(time.perf_counter() - started) * 1000:.1f}ms')
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _seed(self, holds, expired_ratio):
+        started = time.perf_counter()
+        guest, _ = User.objects.get_or_create(username='benchmark-guest')
+        listing = Listing.objects.create(title='Benchmark listing', description='', price=100, owner=guest)
+        now = timezone.now()
+        expired = int(holds * expired_ratio)
+        check_in_date = date(2030, 1, 1)
+        batch = []
+        for i in range(holds):
+            offset = -(i % 3600) - 1 if i < expired else (i % 3600) + 60
+            batch.append(Booking(
+                listing=listing,
+                guest=guest,
+                check_in_date=check_in_date,
+                check_out_date=check_in_date + timedelta(days=1),
+                status='held',
+                hold_expires_at=now + timedelta(seconds=offset),
+            ))
+            if len(batch) == 10000:
+                Booking.objects.bulk_create(batch)
+                batch = []
+        Booking.objects.bulk_create(batch)
+        self.stdout.write(f'Created {holds} holds in {time.perf_counter() - started:.2f}s')
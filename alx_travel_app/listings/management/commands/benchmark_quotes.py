@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from listings.models import Listing
+from listings.pricing import get_quote, get_rate_plan, nightly_rates
+
+class Command(BaseCommand):
+    help = 'Benchmarks price quotes for a calendar view (one quote per check-in day)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listing', type=int, help='Listing id (defaults to the first listing)')
+        parser.add_argument('--days', type=int, default=365, help='Number of check-in days to quote')
+        parser.add_argument('--nights', type=int, default=7, help='Length of each quoted stay')
+        parser.add_argument('--rounds', type=int, default=10, help='Times to repeat the calendar')
+
+    def handle(self, *args, **options):
+        listing_id = options['listing'] or Listing.objects.values_list('id', flat=True).order_by('id').first()
+        if listing_id is None:
+            raise CommandError('No listings found; run "python manage.py seed" first.')
+
+        start = date.today()
+        stays = [
+            (start + timedelta(days=offset), start + timedelta(days=offset + options['nights']))
+            for offset in range(options['days'])
+        ]
+        total = len(stays) * options['rounds']
+
+        # Pure computation against an already loaded rate plan
+        _, (base_price, rules) = get_rate_plan(listing_id)
+        started = time.perf_counter()
+        for _ in range(options['rounds']):
+            for check_in_date, check_out_date in stays:
+                nightly_rates(base_price, rules, check_in_date, check_out_date)
+        self._report('computed', total, time.perf_counter() - started)
+
+        # Memoized quotes, as served by the quote endpoint
+        for check_in_date, check_out_date in stays:
+            get_quote(listing_id, check_in_date, check_out_date)
+        started = time.perf_counter()
+        for _ in range(options['rounds']):
+            for check_in_date, check_out_date in stays:
+                get_quote(listing_id, check_in_date, check_out_date)
+        self._report('cached', total, time.perf_counter() - started)
+
+    def _report(self, label, count, elapsed):
+        rate = count / elapsed if elapsed else float('inf')
+        self.stdout.write(self.style.SUCCESS(f'{label}: {count} quotes in {elapsed:.3f}s ({rate:,.0f} quotes/sec)'))
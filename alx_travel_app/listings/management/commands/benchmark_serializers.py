@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+from decimal import Decimal
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from listings.fastpath import get_fast_list_plan
+from listings.models import Booking, Listing
+from listings.renderers import OrjsonRenderer
+from listings.serializers import BookingSerializer, ListingSerializer
+from rest_framework.renderers import JSONRenderer
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = 'Compares the fast list path with the regular serializers on large pages (test rows are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows per page')
+        parser.add_argument('--rounds', type=int, default=5, help='Times each page is rendered')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._seed(options['rows'])
+                for label, model, serializer_class in (
+                    ('listings', Listing, ListingSerializer),
+                    ('bookings', Booking, BookingSerializer),
+                ):
+                    queryset = model.objects.order_by('id')[:options['rows']]
+                    self._compare(label, queryset, serializer_class, options['rounds'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _seed(self, rows):
+        rng = random.Random(0)
+        owner, _ = User.objects.get_or_create(username='benchmark-owner')
+        # Non-ASCII text and JavaScript line terminators exercise the escaping rules
+        words = ['cozy', 'villa', 'café', ' ', 'naïve', 'loft', '"quoted"', 'tab\there', 'ሀለ']
+        listings = Listing.objects.bulk_create(
+            Listing(
+                title=' '.join(rng.choices(words, k=3)),
+                description=' '.join(rng.choices(words, k=20)),
+                price=Decimal(rng.randint(1000, 99999)) / 100,
+                owner=owner,
+            )
+            for _ in range(rows)
+        )
+        start = date(2026, 1, 1)
+        Booking.objects.bulk_create(
+            Booking(
+                listing=listings[i % len(listings)],
+                guest=owner,
+                check_in_date=start + timedelta(days=i % 365),
+                check_out_date=start + timedelta(days=i % 365 + 3),
+            )
+            for i in range(rows)
+        )
+
+    def _compare(self, label, queryset, serializer_class, rounds):
+        plan = get_fast_list_plan(serializer_class)
+        if plan is None:
+            raise CommandError(f'{serializer_class.__name__} has no fast list plan')
+        rows = queryset.count()
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        regular = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            actual = OrjsonRenderer().render(plan.rows(queryset))
+        fast = time.perf_counter() - started
+
+        if actual != expected:
+            raise CommandError(f'{label}: fast path output differs from the serializer output')
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: {rows} rows, identical output; '
+            f'serializer {rows * rounds / regular:,.0f} rows/sec, fast path {rows * rounds / fast:,.0f} rows/sec '
+            f'({regular / fast:.1f}x)'
+        ))
@@ -0,0 +1,49 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from listings.recommendations import SimilarityIndex
+
+WORDS = [
+    'cozy', 'modern', 'beachfront', 'mountain', 'urban', 'villa', 'loft', 'cabin', 'apartment', 'cottage',
+    'pool', 'view', 'quiet', 'family', 'garden', 'downtown', 'lake', 'forest', 'studio', 'spacious',
+]
+
+class Command(BaseCommand):
+    help = 'Benchmarks similar listing queries against a synthetic index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=100000, help='Number of synthetic listings')
+        parser.add_argument('--queries', type=int, default=200, help='Number of queries to time')
+        parser.add_argument('--k', type=int, default=10, help='Listings returned per query')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        rows = [
+            (
+                listing_id,
+                ' '.join(rng.sample(WORDS, 3)),
+                ' '.join(rng.choices(WORDS, k=30)),
+                round(rng.uniform(50.0, 500.0), 2),
+                rng.choice([None, rng.uniform(1.0, 5.0)]),
+                rng.randint(0, 200),
+            )
+            for listing_id in range(1, options['listings'] + 1)
+        ]
+
+        started = time.perf_counter()
+        index = SimilarityIndex.build(rows)
+        self.stdout.write(f'Built {index.matrix.shape} matrix in {time.perf_counter() - started:.2f}s')
+
+        timings = []
+        for _ in range(options['queries']):
+            listing_id = rng.randint(1, options['listings'])
+            started = time.perf_counter()
+            index.similar(listing_id, options['k'])
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["queries"]} queries: median {statistics.median(timings):.2f}ms, '
+            f'p95 {timings[int(len(timings) * 0.95) - 1]:.2f}ms, max {timings[-1]:.2f}ms'
+        ))
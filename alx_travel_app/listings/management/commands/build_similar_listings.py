@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from listings.recommendations import build_index
+
+class Command(BaseCommand):
+    help = 'Builds the feature matrix used for similar listing recommendations'
+
+    def handle(self, *args, **options):
+        index = build_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(index.ids)} listings ({index.matrix.shape[1]} features) into {settings.SIMILAR_LISTINGS_INDEX_PATH}'
+        ))
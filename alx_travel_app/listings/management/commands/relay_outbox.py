@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from listings.outbox import OUTBOX_BATCH_SIZE, backlog, relay
+
+class Command(BaseCommand):
+    help = 'Relays pending outbox events to Celery and reports throughput and lag'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE, help='Events published per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting once the outbox is drained')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            metrics = relay(batch_size=options['batch_size'])
+            pending = backlog()
+            if metrics['dispatched'] or metrics['failed'] or not options['loop']:
+                self.stdout.write(
+                    f"dispatched={metrics['dispatched']} failed={metrics['failed']} "
+                    f"throughput={metrics['throughput']:.1f}/s max_lag={metrics['max_lag']:.1f}s "
+                    f"pending={pending['pending']} oldest_pending={pending['oldest_age']:.1f}s"
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
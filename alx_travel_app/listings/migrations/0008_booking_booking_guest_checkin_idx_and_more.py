@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 20:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_archivedbooking_archivedpayment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['guest', 'check_in_date', 'id'], name='booking_guest_checkin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'booking'], name='payment_status_booking_idx'),
+        ),
+    ]
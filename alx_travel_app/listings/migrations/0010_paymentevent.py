@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 20:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_booking_hold_expires_at_booking_status_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('source', models.CharField(max_length=20)),
+                ('from_status', models.CharField(blank=True, max_length=20)),
+                ('to_status', models.CharField(max_length=20)),
+                ('http_status', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('chapa_response', models.JSONField(blank=True, null=True)),
+                ('latency_ms', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('payment', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='listings.payment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['transaction_id', 'created_at'], name='payment_event_tx_idx')],
+            },
+        ),
+    ]
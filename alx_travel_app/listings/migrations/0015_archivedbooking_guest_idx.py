@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0014_archivedbooking_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['guest_id', 'check_in_date', 'id'], name='archived_booking_guest_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Listing(models.Model):
     title = models.CharField(max_length=255)
@@ -10,11 +12,55 @@ class Listing(models.Model):
     def __str__(self):
         return self.title
 
+class BookingQuerySet(models.QuerySet):
+    def active(self, now=None):
+        """
+        Bookings that take up inventory: confirmed ones and unexpired holds.
+        """
+        now = now or timezone.now()
+        return self.filter(Q(status="confirmed") | Q(status="held", hold_expires_at__gt=now))
+
+    def overlapping(self, listing_id, check_in_date, check_out_date, now=None):
+        """
+        Active bookings of a listing that share a night with the given stay.
+        """
+        return self.active(now).filter(
+            listing_id=listing_id,
+            check_in_date__lt=check_out_date,
+            check_out_date__gt=check_in_date,
+        )
+
+    def expired_holds(self, now=None):
+        now = now or timezone.now()
+        return self.filter(status="held", hold_expires_at__lte=now)
+
 class Booking(models.Model):
+    STATUS_CHOICES = [
+        ("held", "Held"),
+        ("confirmed", "Confirmed"),
+        ("expired", "Expired"),
+    ]
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE)
     guest = models.ForeignKey(User, on_delete=models.CASCADE)
     check_in_date = models.DateField()
     check_out_date = models.DateField()
+    # Unpaid bookings hold their nights until hold_expires_at (see holds.py)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="confirmed")
+    hold_expires_at = models.DateTimeField(blank=True, null=True)
+
+    objects = BookingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves availability range queries for one or more listings
+            models.Index(fields=["listing", "check_in_date", "check_out_date"], name="booking_listing_dates_idx"),
+            # Serves a guest's trips in check-in order with keyset pagination
+            models.Index(fields=["guest", "check_in_date", "id"], name="booking_guest_checkin_idx"),
+            # Lets the hold sweeper find expired holds without scanning
+            models.Index(fields=["status", "hold_expires_at"], name="booking_hold_expiry_idx"),
+            # Admin date filter
+            models.Index(fields=["check_in_date"], name="booking_checkin_idx"),
+        ]
 
     def __str__(self):
         return f"Booking for {self.listing.title} by {self.guest.username}"
@@ -37,6 +83,8 @@ class Payment(models.Model):
         ("completed", "Completed"),
         ("failed", "Failed"),
         ("cancelled", "Cancelled"),
+        # Paid after the booking's hold lapsed and its nights were taken
+        ("refund_required", "Refund required"),
     ]
     booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name="payment")
     dummyfield = models.TextField(default="n/a")
@@ -46,5 +94,126 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "booking"], name="payment_status_booking_idx"),
+            # Verification and admin lookups by transaction, admin date filter
+            models.Index(fields=["transaction_id"], name="payment_transaction_idx"),
+            models.Index(fields=["created_at"], name="payment_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"Payment for Booking {self.booking.id} - {self.status}"
+
+
+# Nightly price override for a listing, applied by season and/or weekday
+class PriceRule(models.Model):
+    WEEKDAY_CHOICES = [
+        (0, "Monday"),
+        (1, "Tuesday"),
+        (2, "Wednesday"),
+        (3, "Thursday"),
+        (4, "Friday"),
+        (5, "Saturday"),
+        (6, "Sunday"),
+    ]
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="price_rules")
+    name = models.CharField(max_length=100, blank=True)
+    # Inclusive date range; leave both empty for a rule that applies all year
+    start_date = models.DateField(blank=True, null=True)
+    end_date = models.DateField(blank=True, null=True)
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES, blank=True, null=True)
+    nightly_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # When several rules match a night, the highest priority wins
+    priority = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name or 'Price rule'} for {self.listing.title}"
+
+
+
+# Append-only log of payment status changes and what Chapa answered, written
+# in batches by payment_events.py. No FK constraint so events outlive archived
+# payments.
+class PaymentEvent(models.Model):
+    payment = models.ForeignKey(
+        Payment, on_delete=models.DO_NOTHING, db_constraint=False, related_name="events",
+    )
+    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    source = models.CharField(max_length=20)
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20)
+    http_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    chapa_response = models.JSONField(blank=True, null=True)
+    latency_ms = models.FloatField(blank=True, null=True)
+    # Set when the event happens rather than when its batch is written
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["transaction_id", "created_at"], name="payment_event_tx_idx"),
+        ]
+
+    def __str__(self):
+        return f"Payment {self.payment_id}: {self.from_status or '-'} -> {self.to_status}"
+
+
+# Task queued in the same transaction as the change that triggers it and
+# relayed to Celery afterwards (see outbox.py)
+class OutboxEvent(models.Model):
+    task_name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict)
+    dedupe_key = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(blank=True, null=True)
+    # Set by the first worker that runs the task (see outbox.claim_delivery)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # The relay scans undispatched events oldest first
+            models.Index(fields=["dispatched_at", "id"], name="outbox_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.task_name} ({self.dedupe_key})"
+
+
+
+# Completed stays moved out of the Booking table by archive.py. The original
+# primary key is kept so archived bookings can still be looked up by id.
+class ArchivedBooking(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    listing_id = models.BigIntegerField()
+    guest_id = models.BigIntegerField()
+    check_in_date = models.DateField()
+    check_out_date = models.DateField()
+    # Expired holds are archived too and must not read as past stays
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES, default="confirmed")
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Serves a guest's past trips in check-in order with keyset pagination
+            models.Index(fields=["guest_id", "check_in_date", "id"], name="archived_booking_guest_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived booking {self.id}"
+
+
+# Settled payments archived together with their booking
+class ArchivedPayment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    booking_id = models.BigIntegerField(unique=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Payment.STATUS_CHOICES)
+    transaction_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
     def __str__(self):
-        return f"Payment for Booking {self.booking.id} - {self.status}"
\ No newline at end of file
+        return f"Archived payment for Booking {self.booking_id} - {self.status}"
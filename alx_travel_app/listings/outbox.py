@@ -0,0 +1,183 @@
+"""
+Transactional outbox for Celery side effects.
+
+Instead of calling ``task.delay()`` inline, views record an OutboxEvent in
+the same database transaction as the change that triggers it, so a rolled
+back request never sends anything and a slow or unavailable broker never
+blocks the request. A relay (the ``relay_outbox`` management command or the
+periodic ``relay_outbox`` task) drains pending events in batches.
+
+Delivery is at-least-once: an event is only marked dispatched after the
+broker accepted it. Each event is published with a task id derived from its
+dedupe key, and tasks call ``claim_delivery`` to skip duplicates. Claims are
+recorded on the event row itself, so they hold across every worker process.
+A task that fails releases its claim and retries under the same task id.
+Dispatched events are pruned after ``OUTBOX_RETENTION_DAYS``.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from celery import current_app
+from django.db import transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_TASK_ID_PREFIX = "outbox:"
+# Dispatched events are kept this long so late redeliveries are still deduplicated
+OUTBOX_RETENTION_DAYS = 7
+
+
+def enqueue(task, dedupe_key, **kwargs):
+    """
+    Record ``task(**kwargs)`` for delivery once the current transaction commits.
+
+    Enqueueing the same dedupe key twice is a no-op.
+    """
+    event, _ = OutboxEvent.objects.get_or_create(
+        dedupe_key=dedupe_key,
+        defaults={"task_name": task.name, "payload": kwargs},
+    )
+    return event
+
+
+def claim_delivery(task_id):
+    """
+    Return False if a task with this outbox id was already delivered.
+
+    Tasks not published by the outbox relay are always delivered.
+    """
+    if not task_id or not task_id.startswith(OUTBOX_TASK_ID_PREFIX):
+        return True
+    # A conditional UPDATE is atomic, so exactly one concurrent delivery wins
+    claimed = OutboxEvent.objects.filter(
+        dedupe_key=task_id[len(OUTBOX_TASK_ID_PREFIX):],
+        delivered_at__isnull=True,
+    ).update(delivered_at=timezone.now())
+    return claimed == 1
+
+
+def release_delivery(task_id):
+    """
+    Forget a claimed delivery so a redelivered task can run again.
+    """
+    if task_id and task_id.startswith(OUTBOX_TASK_ID_PREFIX):
+        OutboxEvent.objects.filter(dedupe_key=task_id[len(OUTBOX_TASK_ID_PREFIX):]).update(delivered_at=None)
+
+
+def relay_batch(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Publish up to ``batch_size`` pending events to Celery.
+
+    Returns metrics for the batch: events dispatched and failed, elapsed
+    seconds, throughput in events per second and the largest lag in seconds
+    between an event being recorded and being dispatched.
+    """
+    started = time.perf_counter()
+    dispatched_ids = []
+    failed = 0
+    max_lag = 0.0
+    with transaction.atomic():
+        # skip_locked lets several relays drain the outbox concurrently
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(dispatched_at__isnull=True)
+            .order_by("id")[:batch_size]
+        )
+        now = timezone.now()
+        for event in events:
+            try:
+                current_app.send_task(
+                    event.task_name,
+                    kwargs=event.payload,
+                    task_id=f"{OUTBOX_TASK_ID_PREFIX}{event.dedupe_key}",
+                )
+            except Exception as e:
+                # The broker is most likely down; leave the rest for the next run
+                failed += 1
+                OutboxEvent.objects.filter(pk=event.pk).update(attempts=F("attempts") + 1, last_error=str(e))
+                logger.warning("Outbox relay failed to publish %s: %s", event.dedupe_key, e)
+                break
+            dispatched_ids.append(event.pk)
+            max_lag = max(max_lag, (now - event.created_at).total_seconds())
+        if dispatched_ids:
+            OutboxEvent.objects.filter(pk__in=dispatched_ids).update(
+                dispatched_at=timezone.now(),
+                attempts=F("attempts") + 1,
+                last_error="",
+            )
+
+    elapsed = time.perf_counter() - started
+    metrics = {
+        "dispatched": len(dispatched_ids),
+        "failed": failed,
+        "elapsed": elapsed,
+        "throughput": len(dispatched_ids) / elapsed if elapsed else 0.0,
+        "max_lag": max_lag,
+    }
+    if events:
+        logger.info(
+            "Outbox relay dispatched %(dispatched)d events (%(failed)d failed) "
+            "in %(elapsed).3fs, %(throughput).1f events/s, max lag %(max_lag).1fs",
+            metrics,
+        )
+    return metrics
+
+
+def relay(batch_size=OUTBOX_BATCH_SIZE, max_batches=None):
+    """
+    Drain the outbox batch by batch until it is empty, a publish fails or
+    ``max_batches`` batches were relayed. Returns the combined metrics.
+    """
+    totals = {"dispatched": 0, "failed": 0, "elapsed": 0.0, "max_lag": 0.0, "batches": 0}
+    while max_batches is None or totals["batches"] < max_batches:
+        metrics = relay_batch(batch_size)
+        totals["batches"] += 1
+        totals["dispatched"] += metrics["dispatched"]
+        totals["failed"] += metrics["failed"]
+        totals["elapsed"] += metrics["elapsed"]
+        totals["max_lag"] = max(totals["max_lag"], metrics["max_lag"])
+        if metrics["failed"] or metrics["dispatched"] < batch_size:
+            break
+    totals["throughput"] = totals["dispatched"] / totals["elapsed"] if totals["elapsed"] else 0.0
+    return totals
+
+
+def prune_delivered(days=OUTBOX_RETENTION_DAYS, batch_size=OUTBOX_BATCH_SIZE * 10):
+    """
+    Delete events dispatched more than ``days`` days ago, in batches.
+
+    Returns the number of events deleted.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    total = 0
+    while True:
+        # Walks the (dispatched_at, id) index
+        ids = list(
+            OutboxEvent.objects.filter(dispatched_at__lt=cutoff)
+            .order_by("dispatched_at", "id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return total
+        OutboxEvent.objects.filter(pk__in=ids).delete()
+        total += len(ids)
+        if len(ids) < batch_size:
+            return total
+
+
+def backlog():
+    """
+    Return the number of pending events and the age in seconds of the oldest one.
+    """
+    pending = OutboxEvent.objects.filter(dispatched_at__isnull=True)
+    oldest = pending.aggregate(oldest=Min("created_at"))["oldest"]
+    return {
+        "pending": pending.count(),
+        "oldest_age": (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+    }
@@ -0,0 +1,25 @@
+"""
+Keyset pagination over ``(date, id)`` positions.
+
+Unlike offset pagination, fetching the next page seeks directly to the last
+row seen through an index, so every page costs the same however deep it is.
+"""
+import base64
+from datetime import date
+
+
+def encode_cursor(position_date, position_id):
+    raw = f"{position_date.isoformat()}:{position_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Return the ``(date, id)`` encoded in a cursor. Raises ValueError if it is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        position_date, position_id = raw.split(":")
+        return date.fromisoformat(position_date), int(position_id)
+    except (UnicodeError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor.") from e
@@ -0,0 +1,109 @@
+"""
+Buffered writer for the payment event log.
+
+Recording an event only appends it to an in-process buffer; a background
+thread writes the buffer with one ``bulk_create`` when it reaches
+``PAYMENT_EVENT_BATCH_SIZE`` events or every ``PAYMENT_EVENT_FLUSH_INTERVAL``
+seconds, and once more at interpreter exit. The verify path therefore never
+waits on an extra INSERT. Events buffered in a process that is killed
+(or, like a Celery prefork child, exits without running ``atexit``) before
+flushing are lost, so background jobs write their events directly.
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import PaymentEvent
+
+logger = logging.getLogger(__name__)
+
+# Failed batches are retried, but never buffer more than this many batches
+MAX_BUFFERED_BATCHES = 10
+
+
+class PaymentEventWriter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.wake = threading.Event()
+        self.thread = None
+        self.pid = None
+
+    @property
+    def batch_size(self):
+        return getattr(settings, "PAYMENT_EVENT_BATCH_SIZE", 100)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, "PAYMENT_EVENT_FLUSH_INTERVAL", 1.0)
+
+    def record(self, **fields):
+        """
+        Buffer a PaymentEvent built from ``fields``.
+        """
+        fields.setdefault("created_at", timezone.now())
+        event = PaymentEvent(**fields)
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked worker: the parent's thread and buffer are not ours
+                self.buffer = []
+                self.thread = None
+                self.pid = os.getpid()
+            self.buffer.append(event)
+            full = len(self.buffer) >= self.batch_size
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="payment-event-writer", daemon=True)
+                self.thread.start()
+        if full:
+            self.wake.set()
+
+    def flush(self):
+        """
+        Write every buffered event now.
+        """
+        with self.lock:
+            events, self.buffer = self.buffer, []
+        if not events:
+            return
+        try:
+            PaymentEvent.objects.bulk_create(events)
+        except Exception:
+            logger.exception("Failed to write %d payment events", len(events))
+            with self.lock:
+                self.buffer[:0] = events[-self.batch_size * MAX_BUFFERED_BATCHES:]
+            raise
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+
+writer = PaymentEventWriter()
+atexit.register(lambda: writer.flush() if writer.buffer else None)
+
+
+def record_transition(payment, from_status, source, response=None, http_status=None, latency_ms=None):
+    """
+    Log a payment moving from ``from_status`` to its current status.
+    """
+    writer.record(
+        payment_id=payment.id,
+        transaction_id=payment.transaction_id,
+        source=source,
+        from_status=from_status or "",
+        to_status=payment.status,
+        http_status=http_status,
+        chapa_response=response,
+        latency_ms=latency_ms,
+    )
@@ -0,0 +1,101 @@
+"""
+Booking price quotes.
+
+A quote is the sum of nightly rates between check-in and check-out. The
+listing's base price applies to every night unless a PriceRule matches it;
+rules are applied in ascending priority so the highest priority one wins.
+Rate plans and quotes are memoized per listing and invalidated whenever the
+listing price or one of its price rules changes (see signals.py). Amounts
+that are actually charged are always computed from the database.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .caching import get_version
+from .models import Listing, PriceRule
+
+PRICING_NAMESPACE = "pricing"
+QUOTE_CACHE_TIMEOUT = 60 * 60
+MAX_QUOTE_NIGHTS = 365
+
+
+def get_rate_plan(listing_id):
+    """
+    Return ``(version, (base_price, rules))`` for a listing.
+
+    Rules are ``(start_date, end_date, weekday, nightly_price)`` tuples in
+    ascending priority. Raises ``Listing.DoesNotExist`` for unknown listings.
+    """
+    version = get_version(PRICING_NAMESPACE, listing_id)
+    key = f"rate_plan:{listing_id}:{version}"
+    plan = cache.get(key)
+    if plan is None:
+        plan = _load_rate_plan(listing_id)
+        cache.set(key, plan, QUOTE_CACHE_TIMEOUT)
+    return version, plan
+
+
+def _load_rate_plan(listing_id):
+    base_price = Listing.objects.values_list("price", flat=True).get(pk=listing_id)
+    rules = list(
+        PriceRule.objects.filter(listing_id=listing_id)
+        .order_by("priority", "id")
+        .values_list("start_date", "end_date", "weekday", "nightly_price")
+    )
+    return base_price, rules
+
+
+def nightly_rates(base_price, rules, check_in_date, check_out_date):
+    """
+    Return the rate for each night of a stay.
+
+    Each rule is applied as a single slice assignment over the nights it
+    covers (stepping by 7 for weekday rules) instead of testing every night
+    against every rule.
+    """
+    nights = (check_out_date - check_in_date).days
+    rates = [base_price] * nights
+    for start_date, end_date, weekday, nightly_price in rules:
+        first = 0 if start_date is None else max((start_date - check_in_date).days, 0)
+        stop = nights if end_date is None else min((end_date - check_in_date).days + 1, nights)
+        step = 1
+        if weekday is not None:
+            first += (weekday - (check_in_date + timedelta(days=first)).weekday()) % 7
+            step = 7
+        count = len(range(first, stop, step))
+        if count:
+            rates[first:stop:step] = [nightly_price] * count
+    return rates
+
+
+def get_quote(listing_id, check_in_date, check_out_date):
+    """
+    Return the price quote for a stay, computing it at most once per
+    rate plan version.
+    """
+    version, (base_price, rules) = get_rate_plan(listing_id)
+    key = f"quote:{listing_id}:{version}:{check_in_date.isoformat()}:{check_out_date.isoformat()}"
+    quote = cache.get(key)
+    if quote is None:
+        rates = nightly_rates(base_price, rules, check_in_date, check_out_date)
+        quote = {
+            "listing": listing_id,
+            "check_in_date": check_in_date,
+            "check_out_date": check_out_date,
+            "nights": len(rates),
+            "nightly_rates": rates,
+            "total": sum(rates, Decimal("0.00")),
+        }
+        cache.set(key, quote, QUOTE_CACHE_TIMEOUT)
+    return quote
+
+
+def get_charge_total(listing_id, check_in_date, check_out_date):
+    """
+    Return the total to charge for a stay, from the current rate plan in the
+    database rather than the memoized quote.
+    """
+    base_price, rules = _load_rate_plan(listing_id)
+    return sum(nightly_rates(base_price, rules, check_in_date, check_out_date), Decimal("0.00"))
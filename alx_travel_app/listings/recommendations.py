@@ -0,0 +1,295 @@
+"""
+Similar listing recommendations.
+
+Every listing is described by a feature vector made of a hashed TF-IDF of its
+title and description, soft bins over its log price and average rating, and
+its review count. Rows are L2-normalised and stacked into one NumPy matrix,
+so the listings most similar to a listing are found with a single
+matrix-vector product and a partial sort.
+
+The matrix is built in batch (``build_similar_listings`` command or the
+``build_similarity_index`` task) and saved to
+``settings.SIMILAR_LISTINGS_INDEX_PATH``. Each process loads it lazily,
+reloads it when a newer build is saved, and keeps it current incrementally in
+between: listing and review writes append the listing id to a change log in
+the cache shared by all processes (``settings.CACHES``, see signals.py), and
+changed rows are recomputed before the next query. When too many changes are
+pending, or part of the log has expired, processes keep serving their index
+and queue one ``build_similarity_index`` run through the outbox instead of
+rebuilding inline; they pick up the saved result by its mtime.
+"""
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count
+
+from .models import Listing
+
+TEXT_FEATURES = 128
+PRICE_BINS = 8
+RATING_BINS = 5
+TEXT_WEIGHT = 1.0
+PRICE_WEIGHT = 0.6
+RATING_WEIGHT = 0.4
+REVIEW_COUNT_WEIGHT = 0.2
+
+CHANGE_SEQUENCE_KEY = "similar_listings:sequence"
+CHANGE_LOG_TIMEOUT = 24 * 60 * 60
+# Past this many pending changes a full rebuild is cheaper than row updates
+MAX_INCREMENTAL_CHANGES = 1000
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def listing_rows(listing_ids=None):
+    """
+    Return ``(id, title, description, price, avg_rating, review_count)``
+    tuples for all listings, or only for ``listing_ids``.
+    """
+    listings = Listing.objects.all()
+    if listing_ids is not None:
+        listings = listings.filter(pk__in=listing_ids)
+    return list(
+        listings.annotate(avg_rating=Avg("review__rating"), review_count=Count("review"))
+        .order_by("id")
+        .values_list("id", "title", "description", "price", "avg_rating", "review_count")
+    )
+
+
+def _term_counts(rows):
+    # (n, TEXT_FEATURES) term frequencies with tokens hashed into buckets
+    counts = np.zeros((len(rows), TEXT_FEATURES), dtype=np.float32)
+    row_indexes, buckets = [], []
+    for index, row in enumerate(rows):
+        for token in TOKEN_RE.findall(f"{row[1]} {row[2]}".lower()):
+            row_indexes.append(index)
+            buckets.append(zlib.crc32(token.encode()) % TEXT_FEATURES)
+    np.add.at(counts, (np.array(row_indexes, dtype=np.intp), np.array(buckets, dtype=np.intp)), 1.0)
+    return counts
+
+
+def _soft_bins(values, centers, width):
+    # Gaussian membership of each value in every bin; missing values stay zero
+    values = np.asarray(values, dtype=np.float32)[:, None]
+    bins = np.exp(-(((values - centers[None, :]) / width) ** 2))
+    return np.nan_to_num(bins, nan=0.0).astype(np.float32)
+
+
+def _normalise(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class SimilarityIndex:
+    """
+    In-memory matrix of listing feature vectors.
+    """
+
+    def __init__(self, ids, matrix, idf, price_centers, price_width, sequence=0):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.price_centers = np.asarray(price_centers, dtype=np.float32)
+        self.price_width = float(price_width)
+        self.sequence = int(sequence)
+        self.active = np.ones(len(self.ids), dtype=bool)
+        self.rebuild_queued = False
+        self.positions = {int(listing_id): position for position, listing_id in enumerate(self.ids)}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, rows, sequence=0):
+        """
+        Build an index from ``listing_rows()``-shaped tuples.
+        """
+        counts = _term_counts(rows)
+        document_frequency = (counts > 0).sum(axis=0)
+        idf = np.log((1 + len(rows)) / (1 + document_frequency)).astype(np.float32) + 1.0
+
+        log_prices = np.log1p(np.array([float(row[3]) for row in rows], dtype=np.float32))
+        if len(rows):
+            price_centers = np.quantile(log_prices, np.linspace(0, 1, PRICE_BINS)).astype(np.float32)
+            price_width = max(float(log_prices.std()), 0.1)
+        else:
+            price_centers, price_width = np.zeros(PRICE_BINS, dtype=np.float32), 1.0
+
+        index = cls([row[0] for row in rows], np.zeros((0, 0)), idf, price_centers, price_width, sequence)
+        index.matrix = index._vectors(rows, counts)
+        return index
+
+    def _vectors(self, rows, counts=None):
+        if counts is None:
+            counts = _term_counts(rows)
+        text = _normalise(counts * self.idf) * TEXT_WEIGHT
+        log_prices = np.log1p(np.array([float(row[3]) for row in rows], dtype=np.float32))
+        price = _soft_bins(log_prices, self.price_centers, self.price_width) * PRICE_WEIGHT
+        ratings = [np.nan if row[4] is None else float(row[4]) for row in rows]
+        rating = _soft_bins(ratings, np.arange(1, RATING_BINS + 1, dtype=np.float32), 1.0) * RATING_WEIGHT
+        review_counts = np.array([row[5] for row in rows], dtype=np.float32).reshape(-1, 1)
+        review_count = np.log1p(review_counts) / np.log1p(1000) * REVIEW_COUNT_WEIGHT
+        return _normalise(np.hstack([text, price, rating, review_count]).astype(np.float32))
+
+    def update(self, listing_ids):
+        """
+        Recompute the rows of changed listings, adding new and dropping deleted ones.
+        """
+        rows = listing_rows(listing_ids)
+        vectors = self._vectors(rows) if rows else None
+        found = set()
+        with self.lock:
+            new_ids, new_vectors = [], []
+            for row, vector in zip(rows, vectors if vectors is not None else []):
+                found.add(row[0])
+                position = self.positions.get(row[0])
+                if position is None:
+                    new_ids.append(row[0])
+                    new_vectors.append(vector)
+                else:
+                    self.matrix[position] = vector
+                    self.active[position] = True
+            for listing_id in set(listing_ids) - found:
+                position = self.positions.get(listing_id)
+                if position is not None:
+                    self.active[position] = False
+            if new_ids:
+                start = len(self.ids)
+                self.ids = np.concatenate([self.ids, np.array(new_ids, dtype=np.int64)])
+                self.matrix = np.vstack([self.matrix, np.array(new_vectors, dtype=np.float32)])
+                self.active = np.concatenate([self.active, np.ones(len(new_ids), dtype=bool)])
+                self.positions.update({listing_id: start + offset for offset, listing_id in enumerate(new_ids)})
+
+    def similar(self, listing_id, k=10):
+        """
+        Return up to ``k`` ``(listing_id, score)`` pairs, most similar first,
+        or None if the listing is not in the index.
+        """
+        with self.lock:
+            position = self.positions.get(listing_id)
+            if position is None or not self.active[position]:
+                return None
+            scores = self.matrix @ self.matrix[position]
+            scores[~self.active] = -np.inf
+            scores[position] = -np.inf
+            k = min(k, int(self.active.sum()) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[i]), float(scores[i])) for i in top]
+
+    def save(self, path):
+        # Write then rename, so a process reloading the file never sees half of it
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                ids=self.ids[self.active],
+                matrix=self.matrix[self.active],
+                idf=self.idf,
+                price_centers=self.price_centers,
+                price_width=self.price_width,
+                sequence=self.sequence,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["ids"], data["matrix"], data["idf"],
+                data["price_centers"], data["price_width"], data["sequence"],
+            )
+
+
+def current_sequence():
+    """
+    Return the position of the latest entry in the shared change log.
+    """
+    cache.add(CHANGE_SEQUENCE_KEY, 0, None)
+    return cache.get(CHANGE_SEQUENCE_KEY, 0)
+
+
+def record_change(listing_id):
+    """
+    Append a changed listing to the change log read by every process.
+    """
+    cache.add(CHANGE_SEQUENCE_KEY, 0, None)
+    sequence = cache.incr(CHANGE_SEQUENCE_KEY)
+    cache.set(f"similar_listings:change:{sequence}", listing_id, CHANGE_LOG_TIMEOUT)
+
+
+def build_index():
+    """
+    Build the index from the database and save it for other processes.
+    """
+    sequence = current_sequence()
+    index = SimilarityIndex.build(listing_rows(), sequence)
+    index.save(settings.SIMILAR_LISTINGS_INDEX_PATH)
+    return index
+
+
+_index = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+def _saved_mtime():
+    try:
+        return os.stat(settings.SIMILAR_LISTINGS_INDEX_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def get_index():
+    """
+    Return this process's index, reloading it when a newer build was saved
+    and applying changes logged since it was built.
+    """
+    global _index, _index_mtime
+    with _index_lock:
+        mtime = _saved_mtime()
+        if _index is None or (mtime is not None and mtime != _index_mtime):
+            if mtime is None:
+                _index = build_index()
+                mtime = _saved_mtime()
+            else:
+                _index = SimilarityIndex.load(settings.SIMILAR_LISTINGS_INDEX_PATH)
+            _index_mtime = mtime
+        index = _index
+        sequence = current_sequence()
+        if sequence > index.sequence and not index.rebuild_queued:
+            if sequence - index.sequence > MAX_INCREMENTAL_CHANGES:
+                _queue_rebuild(index)
+            else:
+                keys = [f"similar_listings:change:{n}" for n in range(index.sequence + 1, sequence + 1)]
+                changes = cache.get_many(keys)
+                if len(changes) < len(keys):
+                    # Part of the log expired; rebuild rather than miss updates
+                    _queue_rebuild(index)
+                else:
+                    index.update(set(changes.values()))
+                    index.sequence = sequence
+    return index
+
+
+def _queue_rebuild(index):
+    # A full build takes seconds on a large table, too long to block queries.
+    # Keyed by the saved file every process loaded, so they ask for one rebuild.
+    from .outbox import enqueue
+    from .tasks import build_similarity_index
+
+    enqueue(build_similarity_index, f"similar-listings-rebuild:{_index_mtime}")
+    index.rebuild_queued = True
+
+
+def similar_listings(listing_id, k=10):
+    """
+    Return up to ``k`` ``(listing_id, score)`` pairs, or None for unknown listings.
+    """
+    return get_index().similar(listing_id, k)
@@ -0,0 +1,171 @@
+"""
+Read-only GraphQL API over listings, bookings, reviews and payments.
+
+Nested fields are resolved through the per-request loaders in loaders.py so
+a query costs a bounded number of SQL queries regardless of how many objects
+it returns. ``QueryCostRule`` rejects queries whose estimated size exceeds
+``settings.GRAPHQL_MAX_QUERY_COST`` before they are executed.
+"""
+import graphene
+from django.conf import settings
+from graphene_django import DjangoObjectType
+from graphql import GraphQLError, ValidationRule
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode, IntValueNode
+
+from .loaders import get_loaders
+from .models import Booking, Listing, Payment, Review
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Assumed length of nested lists (a listing's reviews or bookings) when costing a query
+NESTED_LIST_ESTIMATE = 10
+
+
+def _page(queryset, first, offset):
+    first = max(0, min(first, MAX_PAGE_SIZE))
+    offset = max(0, offset)
+    return list(queryset.order_by("id")[offset:offset + first])
+
+
+class PaymentType(DjangoObjectType):
+    class Meta:
+        model = Payment
+        fields = ("id", "amount", "status", "transaction_id", "created_at", "updated_at")
+        # Return status values as stored, like the REST API
+        convert_choices_to_enum = False
+
+
+class ReviewType(DjangoObjectType):
+    listing = graphene.Field(lambda: ListingType)
+    guest_id = graphene.ID()
+
+    class Meta:
+        model = Review
+        fields = ("id", "rating", "comment")
+
+    def resolve_listing(self, info):
+        return get_loaders(info).listing.load(self.listing_id)
+
+
+class BookingType(DjangoObjectType):
+    listing = graphene.Field(lambda: ListingType)
+    guest_id = graphene.ID()
+    payment = graphene.Field(PaymentType, description="Only visible to the booking's guest")
+
+    class Meta:
+        model = Booking
+        fields = ("id", "check_in_date", "check_out_date")
+
+    def resolve_listing(self, info):
+        return get_loaders(info).listing.load(self.listing_id)
+
+    def resolve_payment(self, info):
+        if info.context.user.id != self.guest_id:
+            return None
+        return get_loaders(info).payment_by_booking.load(self.id)
+
+
+class ListingType(DjangoObjectType):
+    owner_id = graphene.ID()
+    reviews = graphene.List(graphene.NonNull(ReviewType), required=True)
+    bookings = graphene.List(graphene.NonNull(BookingType), required=True)
+
+    class Meta:
+        model = Listing
+        fields = ("id", "title", "description", "price")
+
+    def resolve_reviews(self, info):
+        return get_loaders(info).reviews_by_listing.load(self.id)
+
+    def resolve_bookings(self, info):
+        return get_loaders(info).bookings_by_listing.load(self.id)
+
+
+class Query(graphene.ObjectType):
+    listing = graphene.Field(ListingType, id=graphene.ID(required=True))
+    listings = graphene.List(
+        graphene.NonNull(ListingType),
+        required=True,
+        first=graphene.Int(default_value=DEFAULT_PAGE_SIZE),
+        offset=graphene.Int(default_value=0),
+    )
+    booking = graphene.Field(BookingType, id=graphene.ID(required=True))
+    bookings = graphene.List(
+        graphene.NonNull(BookingType),
+        required=True,
+        first=graphene.Int(default_value=DEFAULT_PAGE_SIZE),
+        offset=graphene.Int(default_value=0),
+    )
+
+    def resolve_listing(self, info, id):
+        listing = Listing.objects.filter(pk=id).first()
+        if listing:
+            get_loaders(info).prime_listings([listing])
+        return listing
+
+    def resolve_listings(self, info, first, offset):
+        listings = _page(Listing.objects.all(), first, offset)
+        get_loaders(info).prime_listings(listings)
+        return listings
+
+    def resolve_booking(self, info, id):
+        booking = Booking.objects.filter(pk=id).first()
+        if booking:
+            get_loaders(info).prime_bookings([booking])
+        return booking
+
+    def resolve_bookings(self, info, first, offset):
+        bookings = _page(Booking.objects.all(), first, offset)
+        get_loaders(info).prime_bookings(bookings)
+        return bookings
+
+
+schema = graphene.Schema(query=Query)
+
+
+class QueryCostRule(ValidationRule):
+    """
+    Rejects operations whose estimated cost is above ``GRAPHQL_MAX_QUERY_COST``.
+
+    Every field costs 1 and the cost of a list field's selection is
+    multiplied by the number of items it may return: its ``first`` argument
+    (``MAX_PAGE_SIZE`` when given as a variable) or ``NESTED_LIST_ESTIMATE``.
+    """
+    list_fields = {"listings", "bookings", "reviews"}
+
+    def enter_operation_definition(self, node, *args):
+        max_cost = getattr(settings, "GRAPHQL_MAX_QUERY_COST", 5000)
+        cost = self._selection_cost(node.selection_set, set(), root=True)
+        if cost > max_cost:
+            self.report_error(GraphQLError(
+                f"Query cost {cost} exceeds the maximum of {max_cost}.", node,
+            ))
+
+    def _selection_cost(self, selection_set, visited_fragments, root=False):
+        if selection_set is None:
+            return 0
+        cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                if selection.name.value.startswith("__"):
+                    continue
+                cost += 1 + self._multiplier(selection, root) * self._selection_cost(selection.selection_set, visited_fragments)
+            elif isinstance(selection, InlineFragmentNode):
+                cost += self._selection_cost(selection.selection_set, visited_fragments, root)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.context.get_fragment(name)
+                if fragment is not None and name not in visited_fragments:
+                    cost += self._selection_cost(fragment.selection_set, visited_fragments | {name}, root)
+        return cost
+
+    def _multiplier(self, field, root):
+        if field.name.value not in self.list_fields:
+            return 1
+        for argument in field.arguments or ():
+            if argument.name.value == "first":
+                if isinstance(argument.value, IntValueNode):
+                    return max(0, min(int(argument.value.value), MAX_PAGE_SIZE))
+                return MAX_PAGE_SIZE
+        # Root lists default to a page, nested lists to an estimate
+        return DEFAULT_PAGE_SIZE if root else NESTED_LIST_ESTIMATE
@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import Listing, Booking
+from .models import Listing, Booking, Payment, PaymentEvent, PriceRule, ArchivedBooking, ArchivedPayment
+from .pricing import MAX_QUOTE_NIGHTS
+from .availability import MAX_CALENDAR_LISTINGS, MAX_CALENDAR_NIGHTS
+from .pagination import decode_cursor
 
 class ListingSerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,7 +14,179 @@ class BookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
         # Name each field for the booking endpoint
-        fields = ['id', 'listing', 'guest', 'check_in_date', 'check_out_date']
+        fields = ['id', 'listing', 'guest', 'check_in_date', 'check_out_date', 'status', 'hold_expires_at']
+        read_only_fields = ['status', 'hold_expires_at']
+
+    def validate(self, attrs):
+        listing = attrs.get('listing', getattr(self.instance, 'listing', None))
+        check_in_date = attrs.get('check_in_date', getattr(self.instance, 'check_in_date', None))
+        check_out_date = attrs.get('check_out_date', getattr(self.instance, 'check_out_date', None))
+        if check_in_date and check_out_date and check_out_date <= check_in_date:
+            raise serializers.ValidationError("check_out_date must be after check_in_date.")
+        if listing and check_in_date and check_out_date:
+            # Expired holds no longer block the dates, swept or not. Creation
+            # repeats this check under a lock on the listing (see BookingViewSet).
+            overlapping = Booking.objects.overlapping(listing.pk, check_in_date, check_out_date)
+            if self.instance is not None:
+                overlapping = overlapping.exclude(pk=self.instance.pk)
+            if overlapping.exists():
+                raise serializers.ValidationError("The listing is not available for the selected dates.")
+        return attrs
+
+# Read-only representation of bookings moved to the archive
+class ArchivedBookingSerializer(serializers.ModelSerializer):
+    listing = serializers.IntegerField(source='listing_id')
+    guest = serializers.IntegerField(source='guest_id')
+    archived = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArchivedBooking
+        fields = ['id', 'listing', 'guest', 'check_in_date', 'check_out_date', 'status', 'archived', 'archived_at']
+
+    def get_archived(self, obj):
+        return True
+
+class PriceRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PriceRule
+        fields = ['id', 'listing', 'name', 'start_date', 'end_date', 'weekday', 'nightly_price', 'priority']
+
+    def validate(self, attrs):
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and end_date < start_date:
+            raise serializers.ValidationError("end_date must not be before start_date.")
+        return attrs
+
+# Serializer for price quote query parameters
+class QuoteRequestSerializer(serializers.Serializer):
+    check_in_date = serializers.DateField()
+    check_out_date = serializers.DateField()
+
+    def validate(self, attrs):
+        nights = (attrs['check_out_date'] - attrs['check_in_date']).days
+        if nights <= 0:
+            raise serializers.ValidationError("check_out_date must be after check_in_date.")
+        if nights > MAX_QUOTE_NIGHTS:
+            raise serializers.ValidationError(f"Quotes are limited to {MAX_QUOTE_NIGHTS} nights.")
+        return attrs
+
+# Serializer for price quotes
+class QuoteSerializer(serializers.Serializer):
+    listing = serializers.IntegerField()
+    check_in_date = serializers.DateField()
+    check_out_date = serializers.DateField()
+    nights = serializers.IntegerField()
+    nightly_rates = serializers.ListField(child=serializers.DecimalField(max_digits=10, decimal_places=2))
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+# Serializer for availability calendar query parameters
+class CalendarRequestSerializer(serializers.Serializer):
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+
+    def validate(self, attrs):
+        nights = (attrs['end_date'] - attrs['start_date']).days
+        if nights <= 0:
+            raise serializers.ValidationError("end_date must be after start_date.")
+        if nights > MAX_CALENDAR_NIGHTS:
+            raise serializers.ValidationError(f"Calendars are limited to {MAX_CALENDAR_NIGHTS} nights.")
+        return attrs
+
+# Serializer for multi-listing availability calendar query parameters
+class CalendarBatchRequestSerializer(CalendarRequestSerializer):
+    ids = serializers.CharField(help_text="Comma-separated listing ids")
+
+    def validate_ids(self, value):
+        try:
+            ids = list(dict.fromkeys(int(listing_id) for listing_id in value.split(',') if listing_id.strip()))
+        except ValueError:
+            raise serializers.ValidationError("ids must be a comma-separated list of integers.")
+        if not ids:
+            raise serializers.ValidationError("At least one listing id is required.")
+        if len(ids) > MAX_CALENDAR_LISTINGS:
+            raise serializers.ValidationError(f"At most {MAX_CALENDAR_LISTINGS} listings can be requested at once.")
+        return ids
+
+# Serializer for availability calendars
+class CalendarSerializer(serializers.Serializer):
+    listing = serializers.IntegerField()
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    bitmap = serializers.CharField(help_text="One character per night, 1 if booked")
+    runs = serializers.ListField(
+        child=serializers.ListField(child=serializers.IntegerField()),
+        help_text="Run-length encoding as [booked, nights] pairs",
+    )
+
+# Serializer for similar listings query parameters
+class SimilarListingsRequestSerializer(serializers.Serializer):
+    k = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+# Serializer for a recommended listing
+class SimilarListingSerializer(ListingSerializer):
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(ListingSerializer.Meta):
+        fields = ListingSerializer.Meta.fields + ['score']
+
+# Serializer for "my trips" query parameters
+class TripsRequestSerializer(serializers.Serializer):
+    when = serializers.ChoiceField(choices=['upcoming', 'past'], default='upcoming')
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    cursor = serializers.CharField(required=False)
+
+    def validate_cursor(self, value):
+        try:
+            return decode_cursor(value)
+        except ValueError:
+            raise serializers.ValidationError("Invalid cursor.")
+
+class TripListingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Listing
+        fields = ['id', 'title', 'price']
+
+class TripPaymentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Payment
+        fields = ['id', 'amount', 'status', 'transaction_id']
+
+# A guest's booking together with its listing and payment
+class TripSerializer(serializers.ModelSerializer):
+    listing = TripListingSerializer()
+    payment = TripPaymentSerializer(allow_null=True)
+
+    archived = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Booking
+        fields = ['id', 'check_in_date', 'check_out_date', 'status', 'hold_expires_at', 'listing', 'payment', 'archived']
+
+    def get_archived(self, obj):
+        return False
+
+class ArchivedTripPaymentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedPayment
+        fields = ['id', 'amount', 'status', 'transaction_id']
+
+# A guest's archived booking, in the same shape as TripSerializer
+class ArchivedTripSerializer(serializers.ModelSerializer):
+    listing = TripListingSerializer(allow_null=True)
+    payment = ArchivedTripPaymentSerializer(allow_null=True)
+    hold_expires_at = serializers.SerializerMethodField()
+    archived = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArchivedBooking
+        fields = ['id', 'check_in_date', 'check_out_date', 'status', 'hold_expires_at', 'listing', 'payment', 'archived']
+
+    def get_hold_expires_at(self, obj):
+        return None
+
+    def get_archived(self, obj):
+        return True
 
 # Serializer for payment initiation
 class PaymentInitSerializer(serializers.Serializer):
@@ -19,4 +194,14 @@ class PaymentInitSerializer(serializers.Serializer):
 
 # Serializer for payment verification
 class PaymentVerifySerializer(serializers.Serializer):
-    transaction_id = serializers.CharField()
\ No newline at end of file
+    transaction_id = serializers.CharField()
+
+
+# Serializer for payment event log lookups
+class PaymentEventsRequestSerializer(serializers.Serializer):
+    transaction_id = serializers.CharField()
+
+class PaymentEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PaymentEvent
+        fields = ['id', 'payment', 'transaction_id', 'source', 'from_status', 'to_status', 'http_status', 'chapa_response', 'latency_ms', 'created_at']
@@ -0,0 +1,53 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .availability import AVAILABILITY_NAMESPACE
+from .caching import bump_version
+from .models import Booking, Listing, PriceRule, Review
+from .pricing import PRICING_NAMESPACE
+from .recommendations import record_change
+
+
+@receiver(post_save, sender=Listing)
+def invalidate_listing_quotes(sender, instance, **kwargs):
+    bump_version(PRICING_NAMESPACE, instance.pk)
+
+
+@receiver(post_delete, sender=Listing)
+def invalidate_listing_calendar(sender, instance, **kwargs):
+    bump_version(PRICING_NAMESPACE, instance.pk)
+    bump_version(AVAILABILITY_NAMESPACE, instance.pk)
+
+
+@receiver(post_save, sender=PriceRule)
+@receiver(post_delete, sender=PriceRule)
+def invalidate_price_rule_quotes(sender, instance, **kwargs):
+    bump_version(PRICING_NAMESPACE, instance.listing_id)
+
+
+@receiver(pre_save, sender=Booking)
+def invalidate_moved_booking_calendar(sender, instance, **kwargs):
+    # A booking moved to another listing frees nights on the previous one
+    if instance.pk is None:
+        return
+    previous_listing_id = Booking.objects.filter(pk=instance.pk).values_list("listing_id", flat=True).first()
+    if previous_listing_id is not None and previous_listing_id != instance.listing_id:
+        bump_version(AVAILABILITY_NAMESPACE, previous_listing_id)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_booking_calendar(sender, instance, **kwargs):
+    bump_version(AVAILABILITY_NAMESPACE, instance.listing_id)
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def refresh_similar_listing(sender, instance, **kwargs):
+    record_change(instance.pk)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def refresh_reviewed_listing(sender, instance, **kwargs):
+    record_change(instance.listing_id)
@@ -1,23 +1,96 @@
 from django.core.mail import send_mail
 from django.conf import settings
 from celery import shared_task
+from .outbox import claim_delivery, prune_delivered, release_delivery, relay
+from .archive import archive
+from .recommendations import build_index
+from .holds import expire_holds
 
-@shared_task
-def send_payment_confirmation_email(user_email, booking_id):
+# Transient SMTP failures are retried with the same task id, which keeps
+# the outbox claim released in between
+EMAIL_RETRY_DELAY = 60
+EMAIL_MAX_RETRIES = 5
+
+@shared_task(bind=True, max_retries=EMAIL_MAX_RETRIES, default_retry_delay=EMAIL_RETRY_DELAY)
+def send_payment_confirmation_email(self, user_email, booking_id):
+    if not claim_delivery(self.request.id):
+        return "Duplicate delivery skipped."
     subject = 'Payment Confirmation'
     message = f'Your payment for booking {booking_id} was successful. Thank you for using our service!'
     from_email = settings.DEFAULT_FROM_EMAIL
     recipient_list = [user_email]
-    send_mail(subject, message, from_email, recipient_list)
+    try:
+        send_mail(subject, message, from_email, recipient_list)
+    except Exception as e:
+        release_delivery(self.request.id)
+        raise self.retry(exc=e)
 
-@shared_task
-def send_booking_confirmation_email(user_email, booking_details):
+@shared_task(bind=True, max_retries=EMAIL_MAX_RETRIES, default_retry_delay=EMAIL_RETRY_DELAY)
+def send_booking_confirmation_email(self, user_email, booking_details):
     """
     Sends a booking confirmation email.
     """
+    if not claim_delivery(self.request.id):
+        return "Duplicate delivery skipped."
     subject = 'Your Booking Confirmation'
     message = f'Thank you for your booking! Here are the details: {booking_details}'
     from_email = settings.DEFAULT_FROM_EMAIL
     recipient_list = [user_email]
-    send_mail(subject, message, from_email, recipient_list)
+    try:
+        send_mail(subject, message, from_email, recipient_list)
+    except Exception as e:
+        release_delivery(self.request.id)
+        raise self.retry(exc=e)
     return "Booking confirmation email sent."
+
+@shared_task
+def relay_outbox():
+    """
+    Publishes pending outbox events to the broker.
+    """
+    return relay()
+
+@shared_task
+def prune_outbox():
+    """
+    Deletes dispatched outbox events past their retention period.
+    """
+    return prune_delivered()
+
+@shared_task
+def archive_old_bookings():
+    """
+    Moves historical bookings and payments into the archive tables.
+    """
+    return archive()
+
+@shared_task
+def build_similarity_index():
+    """
+    Rebuilds the similar listings feature matrix from the database.
+    """
+    return len(build_index().ids)
+
+@shared_task
+def expire_booking_holds():
+    """
+    Releases unpaid bookings whose hold has expired.
+    """
+    return expire_holds()
+
+@shared_task
+def reverify_payment(payment_id):
+    """
+    Re-verifies a payment with Chapa, e.g. from the admin's bulk action.
+    """
+    from .chapa import verify_with_chapa
+    from .models import Payment
+    from .payment_events import writer as payment_event_writer
+
+    payment = Payment.objects.select_related("booking__guest").filter(pk=payment_id).first()
+    if payment is None:
+        return None
+    body, _ = verify_with_chapa(payment, source="admin")
+    # Worker children can exit without running atexit, so write the event now
+    payment_event_writer.flush()
+    return body.get("status")
@@ -1,3 +1,702 @@
-from django.test import TestCase
+import os
+import random
+import tempfile
+from datetime import date, timedelta
+from types import SimpleNamespace
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from graphql import parse, validate
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .availability import encode_runs, get_calendars
+from .chapa import verify_with_chapa
+from .fastpath import get_fast_list_plan
+from .holds import expire_holds
+from .models import ArchivedBooking, ArchivedPayment, Booking, Listing, OutboxEvent, Payment, PaymentEvent, PriceRule
+from .outbox import OUTBOX_TASK_ID_PREFIX, claim_delivery, enqueue, prune_delivered, relay_batch, release_delivery
+from . import recommendations
+from .archive import archive_batch
+from .pagination import decode_cursor, encode_cursor
+from .payment_events import PaymentEventWriter
+from .pricing import get_charge_total, get_quote, nightly_rates
+from .recommendations import SimilarityIndex, build_index, get_index, listing_rows
+from .renderers import OrjsonRenderer
+from .schema import QueryCostRule, schema
+from .serializers import BookingSerializer, ListingSerializer
+from .tasks import send_booking_confirmation_email
+
+# Tests must not depend on a running Redis
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def reference_nightly_rates(base_price, rules, check_in_date, check_out_date):
+    # Night-by-night evaluation; the last (highest priority) matching rule wins
+    rates = []
+    night = check_in_date
+    while night < check_out_date:
+        rate = base_price
+        for start_date, end_date, weekday, nightly_price in rules:
+            if start_date is not None and night < start_date:
+                continue
+            if end_date is not None and night > end_date:
+                continue
+            if weekday is not None and night.weekday() != weekday:
+                continue
+            rate = nightly_price
+        rates.append(rate)
+        night += timedelta(days=1)
+    return rates
+
+
+class NightlyRatesTests(SimpleTestCase):
+    def test_base_price_without_rules(self):
+        rates = nightly_rates(Decimal("100.00"), [], date(2030, 1, 1), date(2030, 1, 4))
+        self.assertEqual(rates, [Decimal("100.00")] * 3)
+
+    def test_weekday_rule(self):
+        # 2030-01-04 is a Friday
+        rules = [(None, None, 4, Decimal("150.00"))]
+        rates = nightly_rates(Decimal("100.00"), rules, date(2030, 1, 1), date(2030, 1, 15))
+        fridays = [i for i, rate in enumerate(rates) if rate == Decimal("150.00")]
+        self.assertEqual(fridays, [3, 10])
+
+    def test_date_range_is_inclusive_and_clipped_to_stay(self):
+        rules = [(date(2029, 12, 30), date(2030, 1, 2), None, Decimal("80.00"))]
+        rates = nightly_rates(Decimal("100.00"), rules, date(2030, 1, 1), date(2030, 1, 5))
+        self.assertEqual(rates, [Decimal("80.00"), Decimal("80.00"), Decimal("100.00"), Decimal("100.00")])
+
+    def test_higher_priority_rule_wins(self):
+        rules = [
+            (date(2030, 1, 1), date(2030, 1, 31), None, Decimal("90.00")),
+            (None, None, 5, Decimal("200.00")),
+        ]
+        rates = nightly_rates(Decimal("100.00"), rules, date(2030, 1, 1), date(2030, 1, 8))
+        self.assertEqual(rates[4], Decimal("200.00"))
+        self.assertEqual(rates[0], Decimal("90.00"))
+
+    def test_matches_night_by_night_reference(self):
+        rng = random.Random(0)
+        origin = date(2030, 1, 1)
+        for _ in range(2000):
+            rules = []
+            for _ in range(rng.randint(0, 4)):
+                start_date = origin + timedelta(days=rng.randint(-10, 40)) if rng.random() < 0.7 else None
+                end_date = origin + timedelta(days=rng.randint(-10, 40)) if rng.random() < 0.7 else None
+                weekday = rng.randint(0, 6) if rng.random() < 0.4 else None
+                rules.append((start_date, end_date, weekday, Decimal(rng.randint(50, 300))))
+            check_in_date = origin + timedelta(days=rng.randint(0, 30))
+            check_out_date = check_in_date + timedelta(days=rng.randint(1, 21))
+            with self.subTest(rules=rules, check_in_date=check_in_date, check_out_date=check_out_date):
+                self.assertEqual(
+                    nightly_rates(Decimal("100"), rules, check_in_date, check_out_date),
+                    reference_nightly_rates(Decimal("100"), rules, check_in_date, check_out_date),
+                )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QuoteTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username="owner")
+        self.listing = Listing.objects.create(title="Cabin", description="", price=Decimal("100.00"), owner=self.owner)
+
+    def test_quote_reflects_new_price_rule(self):
+        check_in_date, check_out_date = date(2030, 1, 1), date(2030, 1, 3)
+        self.assertEqual(get_quote(self.listing.id, check_in_date, check_out_date)["total"], Decimal("200.00"))
+        PriceRule.objects.create(listing=self.listing, nightly_price=Decimal("150.00"), start_date=check_in_date)
+        self.assertEqual(get_quote(self.listing.id, check_in_date, check_out_date)["total"], Decimal("300.00"))
+
+    def test_charge_total_ignores_cached_quote(self):
+        check_in_date, check_out_date = date(2030, 1, 1), date(2030, 1, 3)
+        get_quote(self.listing.id, check_in_date, check_out_date)
+        # A queryset update sends no signal, like a write seen by another process
+        Listing.objects.filter(pk=self.listing.pk).update(price=Decimal("120.00"))
+        self.assertEqual(get_charge_total(self.listing.id, check_in_date, check_out_date), Decimal("240.00"))
+
+
+class EncodeRunsTests(SimpleTestCase):
+    def test_runs(self):
+        self.assertEqual(encode_runs("0011101"), [[0, 2], [1, 3], [0, 1], [1, 1]])
+
+    def test_empty_bitmap(self):
+        self.assertEqual(encode_runs(""), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CalendarTests(TestCase):
+    def setUp(self):
+        self.guest = User.objects.create(username="guest")
+        self.listing = Listing.objects.create(title="Cabin", description="", price=Decimal("100.00"), owner=self.guest)
+        self.empty_listing = Listing.objects.create(title="Loft", description="", price=Decimal("80.00"), owner=self.guest)
+
+    def book(self, check_in_date, check_out_date, **kwargs):
+        return Booking.objects.create(
+            listing=self.listing, guest=self.guest, check_in_date=check_in_date, check_out_date=check_out_date, **kwargs
+        )
+
+    def test_bitmap_clips_bookings_to_window(self):
+        self.book(date(2029, 12, 30), date(2030, 1, 2))
+        self.book(date(2030, 1, 5), date(2030, 1, 20))
+        calendars = get_calendars([self.listing.id, self.empty_listing.id], date(2030, 1, 1), date(2030, 1, 8))
+        self.assertEqual(calendars[self.listing.id]["bitmap"], "1000111")
+        self.assertEqual(calendars[self.listing.id]["runs"], [[1, 1], [0, 3], [1, 3]])
+        self.assertEqual(calendars[self.empty_listing.id]["bitmap"], "0000000")
+
+    def test_expired_holds_are_free(self):
+        now = timezone.now()
+        self.book(date(2030, 1, 1), date(2030, 1, 3), status="held", hold_expires_at=now - timedelta(minutes=1))
+        self.book(date(2030, 1, 4), date(2030, 1, 5), status="held", hold_expires_at=now + timedelta(minutes=5))
+        calendar = get_calendars([self.listing.id], date(2030, 1, 1), date(2030, 1, 6))[self.listing.id]
+        self.assertEqual(calendar["bitmap"], "00010")
+
+    def test_booking_write_invalidates_cached_calendar(self):
+        window = (date(2030, 1, 1), date(2030, 1, 4))
+        self.assertEqual(get_calendars([self.listing.id], *window)[self.listing.id]["bitmap"], "000")
+        self.book(date(2030, 1, 2), date(2030, 1, 3))
+        self.assertEqual(get_calendars([self.listing.id], *window)[self.listing.id]["bitmap"], "010")
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(date(2030, 1, 2), 42)), (date(2030, 1, 2), 42))
+
+    def test_malformed_cursor(self):
+        # Not base64, a date without an id, and a non-numeric id ("2030-01-02:x")
+        for cursor in ["", "not base64!", "MjAzMC0wMS0wMg==", "MjAzMC0wMS0wMjp4"]:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    decode_cursor(cursor)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TripsTests(TestCase):
+    def setUp(self):
+        self.guest = User.objects.create(username="guest")
+        self.listing = Listing.objects.create(title="Cabin", description="", price=Decimal("100.00"), owner=self.guest)
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+
+    def book(self, check_in_offset, check_out_offset):
+        today = timezone.localdate()
+        return Booking.objects.create(
+            listing=self.listing,
+            guest=self.guest,
+            check_in_date=today + timedelta(days=check_in_offset),
+            check_out_date=today + timedelta(days=check_out_offset),
+        )
+
+    def trip_ids(self, **params):
+        ids, cursor = [], None
+        while True:
+            if cursor:
+                params["cursor"] = cursor
+            response = self.client.get("/api/bookings/trips/", params)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(trip["id"] for trip in response.json()["results"])
+            cursor = response.json()["next_cursor"]
+            if cursor is None:
+                return ids
+
+    def test_keyset_pages_cover_every_trip_once(self):
+        bookings = [self.book(day, day + 1) for day in (5, 1, 3, 3, 8, 2, 3)]
+        expected = [booking.id for booking in sorted(bookings, key=lambda b: (b.check_in_date, b.id))]
+        self.assertEqual(self.trip_ids(when="upcoming", limit=2), expected)
+
+    def test_stay_in_progress_is_upcoming(self):
+        in_progress = self.book(-1, 1)
+        past = self.book(-5, -2)
+        self.assertEqual(self.trip_ids(when="upcoming"), [in_progress.id])
+        self.assertEqual(self.trip_ids(when="past"), [past.id])
+
+    def archive(self, check_in_offset, check_out_offset, booking_id, **payment):
+        today = timezone.localdate()
+        booking = ArchivedBooking.objects.create(
+            id=booking_id,
+            listing_id=self.listing.id,
+            guest_id=self.guest.id,
+            check_in_date=today + timedelta(days=check_in_offset),
+            check_out_date=today + timedelta(days=check_out_offset),
+        )
+        if payment:
+            ArchivedPayment.objects.create(
+                id=booking_id, booking_id=booking_id, created_at=timezone.now(), updated_at=timezone.now(), **payment
+            )
+        return booking
+
+    def test_past_includes_archived_bookings(self):
+        live = [self.book(day, day + 1) for day in (-3, -10, -10)]
+        archived = [self.archive(day, day + 1, 1000 + i) for i, day in enumerate((-400, -10, -500))]
+        trips = live + archived
+        expected = [trip.id for trip in sorted(trips, key=lambda t: (t.check_in_date, t.id), reverse=True)]
+        self.assertEqual(self.trip_ids(when="past", limit=2), expected)
+        self.assertEqual(self.trip_ids(when="upcoming"), [])
+
+    def test_archived_trip_includes_payment(self):
+        self.archive(-400, -398, 1000, amount=Decimal("200.00"), status="completed", transaction_id="tx-1")
+        response = self.client.get("/api/bookings/trips/", {"when": "past"})
+        trip = response.json()["results"][0]
+        self.assertTrue(trip["archived"])
+        self.assertEqual(trip["listing"]["id"], self.listing.id)
+        self.assertEqual(trip["payment"]["transaction_id"], "tx-1")
+        self.assertEqual(trip["payment"]["status"], "completed")
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/bookings/trips/", {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FastListPlanTests(TestCase):
+    def setUp(self):
+        guest = User.objects.create(username="guest")
+        listings = [
+            Listing.objects.create(title=title, description="Près de la mer ", price=price, owner=guest)
+            for title, price in [("Cabin", Decimal("100.00")), ("Loft \"city\"", Decimal("80.5"))]
+        ]
+        Booking.objects.create(listing=listings[0], guest=guest, check_in_date=date(2030, 1, 1), check_out_date=date(2030, 1, 3))
+        Booking.objects.create(
+            listing=listings[1], guest=guest, check_in_date=date(2030, 2, 1), check_out_date=date(2030, 2, 2),
+            status="held", hold_expires_at=timezone.now(),
+        )
+
+    def assertMatchesSerializer(self, serializer_class, queryset):
+        plan = get_fast_list_plan(serializer_class)
+        self.assertIsNotNone(plan, f"{serializer_class.__name__} has no fast list plan")
+        self.assertEqual(
+            OrjsonRenderer().render(plan.rows(queryset)),
+            JSONRenderer().render(serializer_class(queryset, many=True).data),
+        )
+
+    def test_listing_output_matches_serializer(self):
+        self.assertMatchesSerializer(ListingSerializer, Listing.objects.order_by("id"))
+
+    def test_booking_output_matches_serializer(self):
+        self.assertMatchesSerializer(BookingSerializer, Booking.objects.order_by("id"))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CHAPA_SECRET="test-secret")
+@mock.patch("listings.chapa.record_transition")
+class VerifyWithChapaTests(TestCase):
+    def setUp(self):
+        self.guest = User.objects.create(username="guest")
+        self.listing = Listing.objects.create(title="Cabin", description="", price=Decimal("100.00"), owner=self.guest)
+
+    def chapa_response(self, status_code=200, body=None):
+        response = mock.Mock(status_code=status_code)
+        response.json.return_value = body or {"status": "success", "data": {"status": "success"}}
+        return mock.patch("listings.chapa.requests.get", return_value=response)
+
+    def held_booking(self, payment_status="pending"):
+        booking = Booking.objects.create(
+            listing=self.listing, guest=self.guest, check_in_date=date(2030, 1, 1), check_out_date=date(2030, 1, 3),
+            status="held", hold_expires_at=timezone.now() - timedelta(minutes=1),
+        )
+        payment = Payment.objects.create(booking=booking, amount=Decimal("200.00"), status=payment_status, transaction_id=f"tx-{booking.id}")
+        return booking, payment
+
+    def test_late_payment_confirms_booking_when_nights_are_free(self, record_transition):
+        booking, payment = self.held_booking()
+        with self.chapa_response():
+            _, status_code = verify_with_chapa(payment)
+        self.assertEqual(status_code, 200)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, "confirmed")
+
+    def test_late_payment_does_not_double_book(self, record_transition):
+        booking, payment = self.held_booking(payment_status="cancelled")
+        Booking.objects.filter(pk=booking.pk).update(status="expired")
+        Booking.objects.create(listing=self.listing, guest=self.guest, check_in_date=date(2030, 1, 2), check_out_date=date(2030, 1, 4))
+        with self.chapa_response():
+            _, status_code = verify_with_chapa(payment)
+        self.assertEqual(status_code, 409)
+        payment.refresh_from_db()
+        booking.refresh_from_db()
+        self.assertEqual(payment.status, "refund_required")
+        self.assertEqual(booking.status, "expired")
+        self.assertEqual(record_transition.call_args.args[1], "cancelled")
+
+    def test_verify_does_not_downgrade_settled_payment_on_error(self, record_transition):
+        _, payment = self.held_booking(payment_status="completed")
+        with mock.patch("listings.chapa.requests.get", side_effect=requests.Timeout("timed out")):
+            _, status_code = verify_with_chapa(payment)
+        self.assertEqual(status_code, 502)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "completed")
+
+    def test_verify_fails_pending_payment_on_error(self, record_transition):
+        _, payment = self.held_booking()
+        with self.chapa_response(status_code=503, body={"status": "error"}):
+            verify_with_chapa(payment)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "failed")
+
+    def test_admin_reverify_keeps_status_on_http_error(self, record_transition):
+        _, payment = self.held_booking(payment_status="completed")
+        with self.chapa_response(status_code=503, body={"status": "error"}):
+            _, status_code = verify_with_chapa(payment, source="admin")
+        self.assertEqual(status_code, 502)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "completed")
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CHAPA_SECRET=None)
+class BookingCreateTests(TestCase):
+    def setUp(self):
+        self.guest = User.objects.create(username="guest")
+        self.listing = Listing.objects.create(title="Cabin", description="", price=Decimal("100.00"), owner=self.guest)
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+
+    def post_booking(self):
+        return self.client.post("/api/bookings/", {
+            "listing": self.listing.id,
+            "guest": self.guest.id,
+            "check_in_date": "2030-01-01",
+            "check_out_date": "2030-01-03",
+        })
+
+    def test_overlap_is_rechecked_under_listing_lock(self):
+        Booking.objects.create(listing=self.listing, guest=self.guest, check_in_date=date(2030, 1, 2), check_out_date=date(2030, 1, 4))
+        # A concurrent request that passed validation before the other booking committed
+        with mock.patch.object(BookingSerializer, "validate", lambda serializer, attrs: attrs):
+            response = self.post_booking()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_expired_hold_does_not_block_creation(self):
+        Booking.objects.create(
+            listing=self.listing, guest=self.guest, check_in_date=date(2030, 1, 1), check_out_date=date(2030, 1, 3),
+            status="held", hold_expires_at=timezone.now() - timedelta(minutes=1),
+        )
+        # Chapa is not configured, so the booking is held but payment fails to start
+        response = self.post_booking()
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(Booking.objects.filter(status="held").count(), 2)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.guest = User.objects.create(username="guest")
+        self.listing = Listing.objects.create(title="Cabin", description="", price=Decimal("100.00"), owner=self.guest)
+        self.cutoff = date(2025, 1, 1)
+
+    def book(self, check_out_date, status="confirmed", payment_status=None):
+        booking = Booking.objects.create(
+            listing=self.listing,
+            guest=self.guest,
+            check_in_date=check_out_date - timedelta(days=2),
+            check_out_date=check_out_date,
+            status=status,
+        )
+        if payment_status:
+            Payment.objects.create(
+                booking=booking, amount=Decimal("200.00"), status=payment_status, transaction_id=f"tx-{booking.id}"
+            )
+        return booking
+
+    def test_archive_batch_moves_bookings_and_payments(self):
+        paid = self.book(date(2024, 6, 1), payment_status="completed")
+        expired = self.book(date(2024, 6, 1), status="expired")
+        recent = self.book(date(2025, 6, 1), payment_status="completed")
+
+        self.assertEqual(archive_batch(self.cutoff), 2)
+        self.assertEqual(list(Booking.objects.values_list("id", flat=True)), [recent.id])
+        self.assertEqual(list(Payment.objects.values_list("booking_id", flat=True)), [recent.id])
+        self.assertEqual(ArchivedBooking.objects.get(pk=expired.id).status, "expired")
+        archived_payment = ArchivedPayment.objects.get(booking_id=paid.id)
+        self.assertEqual(archived_payment.transaction_id, f"tx-{paid.id}")
+        self.assertEqual(archived_payment.status, "completed")
+        self.assertEqual(archive_batch(self.cutoff), 0)
+
+    def test_archive_batch_skips_unsettled_payments(self):
+        self.book(date(2024, 6, 1), payment_status="pending")
+        self.book(date(2024, 6, 1), payment_status="refund_required")
+        self.assertEqual(archive_batch(self.cutoff), 0)
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_archive_batch_respects_batch_size(self):
+        for _ in range(3):
+            self.book(date(2024, 6, 1))
+        self.assertEqual(archive_batch(self.cutoff, batch_size=2), 2)
+        self.assertEqual(archive_batch(self.cutoff, batch_size=2), 1)
+        self.assertEqual(ArchivedBooking.objects.count(), 3)
+
+    def test_retrieve_falls_back_to_archive(self):
+        booking = self.book(date(2024, 6, 1), status="expired")
+        archive_batch(self.cutoff)
+        client = APIClient()
+        client.force_authenticate(self.guest)
+
+        response = client.get(f"/api/bookings/{booking.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "expired")
+        self.assertTrue(response.json()["archived"])
+        self.assertEqual(response.json()["listing"], self.listing.id)
+        self.assertEqual(client.get(f"/api/bookings/{booking.id + 1}/").status_code, 404)
+
+
+class OutboxTests(TestCase):
+    def enqueue_email(self, dedupe_key="booking-confirmation:1"):
+        return enqueue(send_booking_confirmation_email, dedupe_key, user_email="guest@example.com", booking_details="1")
+
+    def test_enqueue_is_deduplicated_by_key(self):
+        self.enqueue_email()
+        self.enqueue_email()
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    @mock.patch("listings.outbox.current_app.send_task")
+    def test_relay_publishes_pending_events_once(self, send_task):
+        event = self.enqueue_email()
+        metrics = relay_batch()
+        self.assertEqual(metrics["dispatched"], 1)
+        send_task.assert_called_once_with(
+            send_booking_confirmation_email.name,
+            kwargs=event.payload,
+            task_id=f"{OUTBOX_TASK_ID_PREFIX}{event.dedupe_key}",
+        )
+        event.refresh_from_db()
+        self.assertIsNotNone(event.dispatched_at)
+        self.assertEqual(relay_batch()["dispatched"], 0)
+
+    @mock.patch("listings.outbox.current_app.send_task", side_effect=ConnectionError("broker down"))
+    def test_relay_keeps_events_pending_when_broker_fails(self, send_task):
+        self.enqueue_email("booking-confirmation:1")
+        self.enqueue_email("booking-confirmation:2")
+        metrics = relay_batch()
+        self.assertEqual((metrics["dispatched"], metrics["failed"]), (0, 1))
+        self.assertEqual(send_task.call_count, 1)
+        self.assertEqual(OutboxEvent.objects.filter(dispatched_at__isnull=True).count(), 2)
+        self.assertEqual(OutboxEvent.objects.get(dedupe_key="booking-confirmation:1").attempts, 1)
+
+    def test_delivery_is_claimed_once(self):
+        event = self.enqueue_email()
+        task_id = f"{OUTBOX_TASK_ID_PREFIX}{event.dedupe_key}"
+        self.assertTrue(claim_delivery(task_id))
+        self.assertFalse(claim_delivery(task_id))
+        release_delivery(task_id)
+        self.assertTrue(claim_delivery(task_id))
+        # Tasks not published by the relay are never deduplicated
+        self.assertTrue(claim_delivery(None))
+
+    @mock.patch("listings.tasks.send_mail", side_effect=[ConnectionError("smtp down"), 1])
+    def test_failed_email_is_retried(self, send_mail):
+        event = self.enqueue_email()
+        result = send_booking_confirmation_email.apply(
+            kwargs=event.payload, task_id=f"{OUTBOX_TASK_ID_PREFIX}{event.dedupe_key}",
+        )
+        self.assertEqual(result.get(), "Booking confirmation email sent.")
+        self.assertEqual(send_mail.call_count, 2)
+        event.refresh_from_db()
+        self.assertIsNotNone(event.delivered_at)
+
+    def test_prune_deletes_only_old_dispatched_events(self):
+        old = self.enqueue_email("old")
+        recent = self.enqueue_email("recent")
+        pending = self.enqueue_email("pending")
+        OutboxEvent.objects.filter(pk=old.pk).update(dispatched_at=timezone.now() - timedelta(days=8))
+        OutboxEvent.objects.filter(pk=recent.pk).update(dispatched_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(prune_delivered(days=7), 1)
+        self.assertEqual(set(OutboxEvent.objects.values_list("pk", flat=True)), {recent.pk, pending.pk})
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CHAPA_SECRET="test-secret", PAYMENT_EVENT_BATCH_SIZE=2)
+class PaymentEventTests(TestCase):
+    def setUp(self):
+        guest = User.objects.create(username="guest")
+        listing = Listing.objects.create(title="Cabin", description="", price=Decimal("100.00"), owner=guest)
+        self.booking = Booking.objects.create(
+            listing=listing, guest=guest, check_in_date=date(2030, 1, 1), check_out_date=date(2030, 1, 3),
+            status="held", hold_expires_at=timezone.now() - timedelta(minutes=1),
+        )
+        self.payment = Payment.objects.create(booking=self.booking, amount=Decimal("200.00"), transaction_id="tx-1")
+        # A writer whose background thread never starts, flushed explicitly
+        self.writer = PaymentEventWriter()
+        self.writer.thread = mock.Mock()
+        self.writer.pid = os.getpid()
+
+    def record(self, to_status="completed"):
+        self.writer.record(payment_id=self.payment.id, transaction_id="tx-1", source="verify", to_status=to_status)
+
+    def test_flush_writes_buffered_events(self):
+        self.record()
+        self.assertEqual(PaymentEvent.objects.count(), 0)
+        self.writer.flush()
+        self.assertEqual(list(PaymentEvent.objects.values_list("to_status", flat=True)), ["completed"])
+        self.assertEqual(self.writer.buffer, [])
+
+    def test_failed_flush_keeps_events_for_retry(self):
+        self.record()
+        with mock.patch.object(PaymentEvent.objects, "bulk_create", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError), self.assertLogs("listings.payment_events", "ERROR"):
+                self.writer.flush()
+        self.assertEqual(len(self.writer.buffer), 1)
+        self.writer.flush()
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+
+    def test_full_buffer_wakes_writer_thread(self):
+        self.record()
+        self.assertFalse(self.writer.wake.is_set())
+        self.record()
+        self.assertTrue(self.writer.wake.is_set())
+
+    @mock.patch("listings.payment_events.threading.Thread")
+    def test_forked_process_drops_parent_buffer(self, thread):
+        self.record("failed")
+        # As seen from a child forked after the parent buffered an event
+        self.writer.pid = -1
+        self.record("completed")
+        thread.return_value.start.assert_called_once()
+        self.writer.flush()
+        self.assertEqual(list(PaymentEvent.objects.values_list("to_status", flat=True)), ["completed"])
+
+    def test_verify_logs_transition(self):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {"status": "success", "data": {"status": "success"}}
+        with mock.patch("listings.payment_events.writer", self.writer), \
+                mock.patch("listings.chapa.requests.get", return_value=response):
+            verify_with_chapa(self.payment)
+        self.writer.flush()
+        event = PaymentEvent.objects.get()
+        self.assertEqual((event.source, event.from_status, event.to_status, event.http_status), ("verify", "pending", "completed", 200))
+        self.assertEqual(event.chapa_response["status"], "success")
+
+    def test_hold_sweeper_logs_cancellations_without_buffering(self):
+        self.assertEqual(expire_holds(), 1)
+        event = PaymentEvent.objects.get()
+        self.assertEqual((event.payment_id, event.source, event.from_status, event.to_status), (self.payment.id, "hold_expiry", "pending", "cancelled"))
+
+    def test_events_endpoint_survives_flush_error(self):
+        PaymentEvent.objects.create(payment_id=self.payment.id, transaction_id="tx-1", source="verify", to_status="completed")
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="admin", is_staff=True))
+        with mock.patch("listings.views.payment_event_writer.flush", side_effect=RuntimeError("db down")):
+            response = client.get("/api/payments/events/", {"transaction_id": "tx-1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, GRAPHQL_MAX_QUERY_COST=5000)
+class GraphQLTests(TestCase):
+    def setUp(self):
+        self.guest = User.objects.create(username="guest")
+        for i in range(3):
+            listing = Listing.objects.create(title=f"Listing {i}", description="", price=Decimal("100.00"), owner=self.guest)
+            for day in range(2):
+                booking = Booking.objects.create(
+                    listing=listing, guest=self.guest,
+                    check_in_date=date(2030, 1, 1) + timedelta(days=day * 3), check_out_date=date(2030, 1, 2) + timedelta(days=day * 3),
+                )
+                Payment.objects.create(booking=booking, amount=Decimal("100.00"), status="completed")
+                listing.review_set.create(guest=self.guest, rating=5, comment="")
+
+    def execute(self, query):
+        result = schema.execute(query, context_value=SimpleNamespace(user=self.guest))
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def test_nested_query_costs_one_query_per_level(self):
+        query = """
+            { listings { id reviews { rating listing { title } } bookings { id payment { status } } } }
+        """
+        # listings, reviews, bookings, payments; reviews' listings come from the loader cache
+        with self.assertNumQueries(4):
+            data = self.execute(query)
+        self.assertEqual(len(data["listings"]), 3)
+        self.assertEqual(data["listings"][0]["reviews"][0]["listing"]["title"], "Listing 0")
+
+    def test_payment_status_matches_rest(self):
+        data = self.execute("{ bookings(first: 1) { payment { status } } }")
+        self.assertEqual(data["bookings"][0]["payment"]["status"], "completed")
+
+    def test_payment_is_hidden_from_other_users(self):
+        result = schema.execute("{ bookings(first: 1) { payment { status } } }", context_value=SimpleNamespace(user=SimpleNamespace(id=None)))
+        self.assertIsNone(result.data["bookings"][0]["payment"])
+
+    def cost_errors(self, query):
+        return validate(schema.graphql_schema, parse(query), [QueryCostRule])
+
+    def test_cost_rule_accepts_small_query(self):
+        self.assertEqual(self.cost_errors("{ listings(first: 10) { id reviews { rating } } }"), [])
+
+    def test_cost_rule_rejects_large_query(self):
+        errors = self.cost_errors("{ listings(first: 100) { id bookings { id listing { reviews { rating } } } } }")
+        self.assertEqual(len(errors), 1)
+        self.assertIn("exceeds the maximum of 5000", errors[0].message)
+
+    def test_cost_rule_assumes_full_page_for_variables(self):
+        selection = "{ id bookings { id listing { id reviews { rating } } } }"
+        self.assertEqual(self.cost_errors(f"{{ listings(first: 5) {selection} }}"), [])
+        self.assertEqual(len(self.cost_errors(f"query ($n: Int) {{ listings(first: $n) {selection} }}")), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SimilarListingsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(SIMILAR_LISTINGS_INDEX_PATH=f"{directory.name}/similar_listings.npz")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Each test starts without a loaded index
+        for name, value in [("_index", None), ("_index_mtime", None)]:
+            patcher = mock.patch.object(recommendations, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.owner = User.objects.create(username="owner")
+        self.beach = self.listing("Beach house with ocean view", Decimal("100.00"))
+        self.villa = self.listing("Ocean view beach villa", Decimal("110.00"))
+        self.cabin = self.listing("Mountain ski cabin", Decimal("500.00"))
+
+    def listing(self, title, price):
+        return Listing.objects.create(title=title, description="", price=price, owner=self.owner)
+
+    def test_similar_ranks_closest_listing_first(self):
+        index = SimilarityIndex.build(listing_rows())
+        matches = index.similar(self.beach.id, k=2)
+        self.assertEqual([listing_id for listing_id, _ in matches], [self.villa.id, self.cabin.id])
+        self.assertGreater(matches[0][1], matches[1][1])
+        self.assertIsNone(index.similar(-1))
+
+    def test_update_adds_and_drops_listings(self):
+        index = SimilarityIndex.build(listing_rows())
+        lodge = self.listing("Mountain ski lodge", Decimal("450.00"))
+        cabin_id = self.cabin.id
+        self.cabin.delete()
+        index.update([lodge.id, cabin_id])
+        self.assertIsNone(index.similar(cabin_id))
+        self.assertNotIn(cabin_id, [listing_id for listing_id, _ in index.similar(lodge.id, k=5)])
+        self.assertEqual(len(index.similar(lodge.id, k=5)), 2)
+
+    def test_get_index_applies_logged_changes(self):
+        index = get_index()
+        lodge = self.listing("Mountain ski lodge", Decimal("450.00"))
+        self.assertIs(get_index(), index)
+        self.assertIsNotNone(index.similar(lodge.id))
+
+    def test_get_index_reloads_newer_saved_build(self):
+        index = get_index()
+        build_index()
+        # Make sure the rebuilt file's mtime differs on coarse filesystems
+        os.utime(settings.SIMILAR_LISTINGS_INDEX_PATH, ns=(0, 0))
+        self.assertIsNot(get_index(), index)
+
+    def test_get_index_queues_rebuild_instead_of_building_inline(self):
+        index = get_index()
+        with mock.patch.object(recommendations, "MAX_INCREMENTAL_CHANGES", 1), \
+                mock.patch.object(SimilarityIndex, "build") as build:
+            self.listing("Lake cottage", Decimal("150.00"))
+            self.listing("City loft", Decimal("90.00"))
+            self.assertIs(get_index(), index)
+            self.assertIs(get_index(), index)
+        build.assert_not_called()
+        events = OutboxEvent.objects.filter(dedupe_key__startswith="similar-listings-rebuild:")
+        self.assertEqual(list(events.values_list("task_name", flat=True)), ["listings.tasks.build_similarity_index"])
@@ -1,11 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ListingViewSet, BookingViewSet
+from .views import ListingViewSet, BookingViewSet, PriceRuleViewSet, PaymentViewSet
 
 # Create a router and register our viewsets with it
 router = DefaultRouter()
 router.register(r'listings', ListingViewSet, basename='listing')
 router.register(r'bookings', BookingViewSet, basename='booking')
+router.register(r'price-rules', PriceRuleViewSet, basename='price-rule')
+router.register(r'payments', PaymentViewSet, basename='payment')
 
 # The API URLs are now determined automatically by the router
 urlpatterns = [
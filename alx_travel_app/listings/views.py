@@ -3,20 +3,43 @@ from rest_framework.response import Response
 from rest_framework import status
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from .models import Listing, Booking, Payment
-from .serializers import ListingSerializer, BookingSerializer
-from rest_framework.permissions import IsAuthenticated
+from .models import Listing, Booking, Payment, PaymentEvent, PriceRule, ArchivedBooking
+from .serializers import ListingSerializer, BookingSerializer, PriceRuleSerializer
+from .serializers import QuoteRequestSerializer, QuoteSerializer
+from .serializers import ArchivedBookingSerializer
+from .serializers import SimilarListingsRequestSerializer, SimilarListingSerializer
+from .serializers import TripsRequestSerializer, TripSerializer, ArchivedTripSerializer
+from .serializers import CalendarRequestSerializer, CalendarBatchRequestSerializer, CalendarSerializer
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 import requests
 from django.conf import settings
 from .serializers import ListingSerializer, BookingSerializer, PaymentInitSerializer
-from .serializers import PaymentVerifySerializer
+from .serializers import PaymentVerifySerializer, PaymentEventsRequestSerializer, PaymentEventSerializer
 from rest_framework import serializers
 from rest_framework.decorators import action
+from django.db import transaction
 from .tasks import send_booking_confirmation_email
+from .outbox import enqueue
+from .archive import archived_trips, get_archived_booking
+from django.http import Http404
+from graphene.validation import depth_limit_validator
+from graphene_django.views import GraphQLView
+from .schema import QueryCostRule
+from .fastpath import FastListMixin
+from .pagination import encode_cursor
+from .holds import hold_expiry
+from .payment_events import record_transition, writer as payment_event_writer
+from .chapa import verify_with_chapa
+import time
+from django.db.models import Q
+from django.utils import timezone
+from .pricing import get_charge_total, get_quote
+from .availability import get_calendars
+from .recommendations import similar_listings
 
 
 
-class ListingViewSet(viewsets.ModelViewSet):
+class ListingViewSet(FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing Listing objects.
     
@@ -96,8 +119,144 @@ class ListingViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
 
+    @swagger_auto_schema(
+        method="get",
+        operation_description="Get a price quote for staying at a listing between two dates",
+        manual_parameters=[
+            openapi.Parameter('check_in_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=True),
+            openapi.Parameter('check_out_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=True),
+        ],
+        responses={
+            200: QuoteSerializer,
+            400: "Bad Request",
+            404: "Not Found"
+        }
+    )
+    @action(detail=True, methods=["get"], url_path="quote", url_name="quote")
+    def quote(self, request, pk=None):
+        """
+        Quote the total price of a stay from the listing's nightly rate and price rules.
+        """
+        serializer = QuoteRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        try:
+            quote = get_quote(
+                int(pk),
+                serializer.validated_data["check_in_date"],
+                serializer.validated_data["check_out_date"],
+            )
+        except (ValueError, Listing.DoesNotExist):
+            return Response({"detail": "Listing not found."}, status=404)
+        return Response(QuoteSerializer(quote).data)
+
+    @swagger_auto_schema(
+        method="get",
+        operation_description="Get the booked nights of a listing between start_date (inclusive) and end_date (exclusive)",
+        manual_parameters=[
+            openapi.Parameter('start_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=True),
+            openapi.Parameter('end_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=True),
+        ],
+        responses={
+            200: CalendarSerializer,
+            400: "Bad Request",
+            404: "Not Found"
+        }
+    )
+    @action(detail=True, methods=["get"], url_path="calendar", url_name="calendar")
+    def calendar(self, request, pk=None):
+        """
+        Availability calendar of a single listing.
+        """
+        serializer = CalendarRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        try:
+            listing_id = int(pk)
+        except ValueError:
+            return Response({"detail": "Listing not found."}, status=404)
+        calendars = get_calendars(
+            [listing_id],
+            serializer.validated_data["start_date"],
+            serializer.validated_data["end_date"],
+        )
+        if listing_id not in calendars:
+            return Response({"detail": "Listing not found."}, status=404)
+        return Response(CalendarSerializer(calendars[listing_id]).data)
+
+    @swagger_auto_schema(
+        method="get",
+        operation_description="Get the availability calendars of several listings, e.g. for a search results page",
+        manual_parameters=[
+            openapi.Parameter('ids', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True, description="Comma-separated listing ids"),
+            openapi.Parameter('start_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=True),
+            openapi.Parameter('end_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=True),
+        ],
+        responses={
+            200: CalendarSerializer(many=True),
+            400: "Bad Request"
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="calendar", url_name="calendar-batch")
+    def calendars(self, request):
+        """
+        Availability calendars of several listings, in the order requested. Unknown ids are skipped.
+        """
+        serializer = CalendarBatchRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        listing_ids = serializer.validated_data["ids"]
+        calendars = get_calendars(
+            listing_ids,
+            serializer.validated_data["start_date"],
+            serializer.validated_data["end_date"],
+        )
+        ordered = [calendars[listing_id] for listing_id in listing_ids if listing_id in calendars]
+        return Response(CalendarSerializer(ordered, many=True).data)
+
+    @swagger_auto_schema(
+        method="get",
+        operation_description="Get the listings most similar to a listing, e.g. to suggest alternatives when it is booked out",
+        manual_parameters=[
+            openapi.Parameter('k', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Number of listings to return (1-50, default 10)"),
+        ],
+        responses={
+            200: SimilarListingSerializer(many=True),
+            400: "Bad Request",
+            404: "Not Found"
+        }
+    )
+    @action(detail=True, methods=["get"], url_path="similar", url_name="similar")
+    def similar(self, request, pk=None):
+        """
+        Most similar listings by price, ratings and description, best match first.
+        """
+        serializer = SimilarListingsRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        try:
+            matches = similar_listings(int(pk), serializer.validated_data["k"])
+        except ValueError:
+            matches = None
+        if matches is None:
+            return Response({"detail": "Listing not found."}, status=404)
+        listings = Listing.objects.in_bulk([listing_id for listing_id, _ in matches])
+        results = []
+        for listing_id, score in matches:
+            if listing_id in listings:
+                listing = listings[listing_id]
+                listing.score = score
+                results.append(listing)
+        return Response(SimilarListingSerializer(results, many=True).data)
+
+
+class PriceRuleViewSet(viewsets.ModelViewSet):
+    """
+    ViewSet for managing seasonal and weekday PriceRule objects of listings.
 
-class BookingViewSet(viewsets.ModelViewSet):
+    Changes invalidate the cached quotes of the affected listing.
+    """
+    queryset = PriceRule.objects.all()
+    serializer_class = PriceRuleSerializer
+
+
+class BookingViewSet(FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing Booking objects.
     
@@ -144,10 +303,24 @@ class BookingViewSet(viewsets.ModelViewSet):
         # Create the booking
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        booking = serializer.save()
-
-        booking_details = f"Booking ID: {booking.id}, Property: {booking.property.name}, Check-in: {booking.check_in_date}, Check-out: {booking.check_out_date}"
-        send_booking_confirmation_email.delay(booking.user.email, booking_details)
+        data = serializer.validated_data
+        with transaction.atomic():
+            # Lock the listing so concurrent requests for the same nights are
+            # checked one at a time, then repeat the serializer's overlap check
+            Listing.objects.select_for_update().get(pk=data["listing"].pk)
+            if Booking.objects.overlapping(data["listing"].pk, data["check_in_date"], data["check_out_date"]).exists():
+                raise serializers.ValidationError("The listing is not available for the selected dates.")
+            # The nights are held until payment completes or the hold expires
+            booking = serializer.save(status="held", hold_expires_at=hold_expiry())
+            if booking.guest.email:
+                # Relayed to Celery only once the booking is committed
+                booking_details = f"Booking ID: {booking.id}, Property: {booking.listing.title}, Check-in: {booking.check_in_date}, Check-out: {booking.check_out_date}"
+                enqueue(
+                    send_booking_confirmation_email,
+                    f"booking-confirmation:{booking.id}",
+                    user_email=booking.guest.email,
+                    booking_details=booking_details,
+                )
 
         # Initiate payment for the booking
         CHAPA_SECRET = getattr(settings, "CHAPA_SECRET", None)
@@ -155,10 +328,10 @@ class BookingViewSet(viewsets.ModelViewSet):
             return Response({"detail": "Chapa secret key not configured."}, status=500)
 
         chapa_url = "https://api.chapa.co/v1/transaction/initialize"
-        amount = float(booking.listing.price)
+        amount = get_charge_total(booking.listing_id, booking.check_in_date, booking.check_out_date)
         user = booking.guest
         payload = {
-            "amount": amount,
+            "amount": str(amount),
             "currency": "ETB",
             "email": user.email or "test@example.com",
             "first_name": user.first_name or "User",
@@ -173,7 +346,9 @@ class BookingViewSet(viewsets.ModelViewSet):
             "Content-Type": "application/json",
         }
         try:
+            started = time.perf_counter()
             chapa_resp = requests.post(chapa_url, json=payload, headers=headers, timeout=10)
+            latency_ms = (time.perf_counter() - started) * 1000
             chapa_data = chapa_resp.json()
             if chapa_resp.status_code != 200 or chapa_data.get("status") != "success":
                 return Response({"detail": "Failed to initiate payment with Chapa.", "chapa_response": chapa_data}, status=502)
@@ -189,6 +364,7 @@ class BookingViewSet(viewsets.ModelViewSet):
             status="pending",
             transaction_id=transaction_id,
         )
+        record_transition(payment, "", "initiate", chapa_data, chapa_resp.status_code, latency_ms)
 
         # Prepare response
         booking_data = BookingSerializer(booking).data
@@ -204,15 +380,102 @@ class BookingViewSet(viewsets.ModelViewSet):
             "checkout_url": checkout_url,
         }, status=201)
     
+    def perform_update(self, serializer):
+        data = serializer.validated_data
+        booking = serializer.instance
+        listing_id = data["listing"].pk if "listing" in data else booking.listing_id
+        with transaction.atomic():
+            # Same locked overlap check as create, for bookings moved to other nights
+            Listing.objects.select_for_update().get(pk=listing_id)
+            overlapping = Booking.objects.overlapping(
+                listing_id,
+                data.get("check_in_date", booking.check_in_date),
+                data.get("check_out_date", booking.check_out_date),
+            ).exclude(pk=booking.pk)
+            if overlapping.exists():
+                raise serializers.ValidationError("The listing is not available for the selected dates.")
+            serializer.save()
+
     @swagger_auto_schema(
-        operation_description="Get a specific booking by ID",
+        method="get",
+        operation_description="Get the current user's upcoming or past trips with their listing and payment; past trips include archived bookings",
+        manual_parameters=[
+            openapi.Parameter('when', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['upcoming', 'past'], description="upcoming includes stays in progress; defaults to upcoming"),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Page size (1-100, default 20)"),
+            openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING, description="next_cursor of the previous page"),
+        ],
+        responses={200: openapi.Response("Trips", schema=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                'next_cursor': openapi.Schema(type=openapi.TYPE_STRING, x_nullable=True),
+            }
+        ))}
+    )
+    @action(detail=False, methods=["get"], url_path="trips", url_name="trips", permission_classes=[IsAuthenticated])
+    def trips(self, request):
+        """
+        The current user's bookings, joined with listing and payment in one query.
+        Past trips also include archived bookings.
+
+        Upcoming trips (including stays in progress, until their check-out day)
+        are ordered by soonest check-in and past trips by most recent check-in.
+        Pages are keyset-paginated on (check_in_date, id).
+        """
+        serializer = TripsRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        when = serializer.validated_data["when"]
+        limit = serializer.validated_data["limit"]
+        cursor = serializer.validated_data.get("cursor")
+
+        today = timezone.localdate()
+        trips = Booking.objects.filter(guest=request.user).select_related("listing", "payment")
+        if when == "upcoming":
+            trips = trips.filter(check_out_date__gte=today).order_by("check_in_date", "id")
+            if cursor:
+                trips = trips.filter(Q(check_in_date__gt=cursor[0]) | Q(check_in_date=cursor[0], id__gt=cursor[1]))
+        else:
+            trips = trips.filter(check_out_date__lt=today).order_by("-check_in_date", "-id")
+            if cursor:
+                trips = trips.filter(Q(check_in_date__lt=cursor[0]) | Q(check_in_date=cursor[0], id__lt=cursor[1]))
+
+        page = list(trips[:limit + 1])
+        if when == "past":
+            # Stays older than a year live in the archive (see archive.py);
+            # ids are shared between both tables, so one cursor covers both
+            page += archived_trips(request.user.id, cursor, limit + 1)
+            page = sorted(page, key=lambda trip: (trip.check_in_date, trip.id), reverse=True)[:limit + 1]
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(page[-1].check_in_date, page[-1].id)
+        return Response({
+            "results": [
+                (ArchivedTripSerializer if isinstance(trip, ArchivedBooking) else TripSerializer)(trip).data
+                for trip in page
+            ],
+            "next_cursor": next_cursor,
+        })
+
+    @swagger_auto_schema(
+        operation_description="Get a specific booking by ID, including archived bookings",
         responses={
             200: BookingSerializer,
             404: "Not Found"
         }
     )
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            # Historical bookings live in the archive tables
+            try:
+                archived = get_archived_booking(int(kwargs["pk"]))
+            except ValueError:
+                archived = None
+            if archived is None:
+                raise
+            return Response(ArchivedBookingSerializer(archived).data)
     
     @swagger_auto_schema(
         operation_description="Update a booking",
@@ -282,15 +545,18 @@ class PaymentViewSet(viewsets.ViewSet):
         if hasattr(booking, "payment"):
             return Response({"detail": "Payment already initiated for this booking."}, status=400)
 
+        if booking.status == "expired" or (booking.status == "held" and booking.hold_expires_at and booking.hold_expires_at <= timezone.now()):
+            return Response({"detail": "The hold on this booking has expired."}, status=400)
+
         # Chapa API integration
         CHAPA_SECRET = getattr(settings, "CHAPA_SECRET", None)
         if not CHAPA_SECRET:
             return Response({"detail": "Chapa secret key not configured."}, status=500)
 
         chapa_url = "https://api.chapa.co/v1/transaction/initialize"
-        amount = float(booking.listing.price)
+        amount = get_charge_total(booking.listing_id, booking.check_in_date, booking.check_out_date)
         payload = {
-            "amount": amount,
+            "amount": str(amount),
             "currency": "ETB",
             "email": request.user.email or "test@example.com",
             "first_name": request.user.first_name or "User",
@@ -305,7 +571,9 @@ class PaymentViewSet(viewsets.ViewSet):
             "Content-Type": "application/json",
         }
         try:
+            started = time.perf_counter()
             chapa_resp = requests.post(chapa_url, json=payload, headers=headers, timeout=10)
+            latency_ms = (time.perf_counter() - started) * 1000
             chapa_data = chapa_resp.json()
             if chapa_resp.status_code != 200 or chapa_data.get("status") != "success":
                 return Response({"detail": "Failed to initiate payment with Chapa.", "chapa_response": chapa_data}, status=502)
@@ -321,6 +589,7 @@ class PaymentViewSet(viewsets.ViewSet):
             status="pending",
             transaction_id=transaction_id,
         )
+        record_transition(payment, "", "initiate", chapa_data, chapa_resp.status_code, latency_ms)
 
         return Response({
             "checkout_url": checkout_url,
@@ -351,49 +620,43 @@ class PaymentViewSet(viewsets.ViewSet):
 
         # Find the payment record
         try:
-            payment = Payment.objects.get(transaction_id=transaction_id)
+            payment = Payment.objects.select_related("booking__guest").get(transaction_id=transaction_id)
         except Payment.DoesNotExist:
             return Response({"detail": "Payment record not found.", "transaction_id": transaction_id}, status=404)
 
-        CHAPA_SECRET = getattr(settings, "CHAPA_SECRET", None)
-        if not CHAPA_SECRET:
-            return Response({"detail": "Chapa secret key not configured."}, status=500)
+        body, status_code = verify_with_chapa(payment)
+        return Response(body, status=status_code)
 
-        chapa_url = f"https://api.chapa.co/v1/transaction/verify/{transaction_id}"
-        headers = {
-            "Authorization": f"Bearer {CHAPA_SECRET}",
-            "Content-Type": "application/json",
-        }
+    @swagger_auto_schema(
+        method="get",
+        operation_description="Get the status change log of a payment, including the raw Chapa responses (staff only)",
+        manual_parameters=[
+            openapi.Parameter('transaction_id', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True),
+        ],
+        responses={200: PaymentEventSerializer(many=True)}
+    )
+    @action(detail=False, methods=["get"], url_path="events", url_name="events", permission_classes=[IsAdminUser])
+    def events(self, request):
+        """
+        Payment events for a transaction, oldest first.
+        """
+        serializer = PaymentEventsRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        # Include events still waiting in this process's buffer
         try:
-            chapa_resp = requests.get(chapa_url, headers=headers, timeout=10)
-            chapa_data = chapa_resp.json()
-            if chapa_resp.status_code != 200 or chapa_data.get("status") != "success":
-                payment.status = "failed"
-                payment.save()
-                return Response({
-                    "transaction_id": transaction_id,
-                    "status": payment.status,
-                    "detail": "Payment verification failed.",
-                    "chapa_response": chapa_data
-                }, status=502)
-            # Chapa returns payment status in chapa_data["data"]["status"]
-            chapa_status = chapa_data["data"].get("status", "")
-            if chapa_status == "success":
-                payment.status = "completed"
-            else:
-                payment.status = "failed"
-            payment.save()
-        except Exception as e:
-            payment.status = "failed"
-            payment.save()
-            return Response({
-                "transaction_id": transaction_id,
-                "status": payment.status,
-                "detail": f"Error contacting Chapa: {str(e)}"
-            }, status=502)
+            payment_event_writer.flush()
+        except Exception:
+            # Already logged and re-buffered; return what has been written
+            pass
+        events = PaymentEvent.objects.filter(
+            transaction_id=serializer.validated_data["transaction_id"],
+        ).order_by("created_at", "id")
+        return Response(PaymentEventSerializer(events, many=True).data)
 
-        return Response({
-            "transaction_id": transaction_id,
-            "status": payment.status,
-            "detail": "Payment verification complete."
-        })
+
+# GraphQL endpoint with query depth and cost limits
+class ListingsGraphQLView(GraphQLView):
+    validation_rules = (
+        depth_limit_validator(max_depth=getattr(settings, "GRAPHQL_MAX_QUERY_DEPTH", 6)),
+        QueryCostRule,
+    )